@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+benchmark of the Accept-Language parsing with hostile headers
+
+Every header is parsed by the former regular expression and by
+parse_accept_language, which caps the header length. The headers are
+sent uncached, as a client would, which changes its header with every
+request.
+
+    python benchmarks/accept_language.py [--length N] [--rounds N]
+"""
+
+import optparse
+import re
+import time
+
+from linotpselfservice.lib.i18n import parse_accept_language
+
+# the former parser of lib/base.py
+accept_language_regexp = re.compile(r'\s*([^\s;,]+)\s*[;\s*q=[0-9.]*]?\s*,?')
+
+
+def regexp_languages(accept_language):
+    return [match.group(1)
+            for match in accept_language_regexp.finditer(accept_language)]
+
+
+def headers(length):
+    """
+    :return: list of (name, header) - a browser header and hostile ones
+             of about the given length
+    """
+    return [
+        ('browser', 'de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7'),
+        ('white space', ' ' * length),
+        ('white space and tab', ' \t' * (length // 2) + 'x'),
+        ('semicolons', ';' * length),
+        ('q parameters', 'de' + ';q=0.5' * (length // 6)),
+        ('many ranges', ','.join(['de;q=0.%d' % (i % 10)
+                                  for i in range(length // 7)])),
+        ('one long tag', 'a' * length),
+        ('spaced tags', 'a ' * (length // 2)),
+        ]
+
+
+def measure(parse, header, rounds):
+    start = time.time()
+    for _i in range(rounds):
+        parse(header)
+    return (time.time() - start) / rounds
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--length', type='int', default=16 * 1024)
+    parser.add_option('--rounds', type='int', default=3)
+    options, _args = parser.parse_args()
+
+    print "headers of %d bytes, %d rounds" % (options.length, options.rounds)
+    print "%-20s %14s %14s" % ('header', 'regexp us', 'parser us')
+    for name, header in headers(options.length):
+        print "%-20s %14.1f %14.1f" % (
+                name,
+                measure(regexp_languages, header, options.rounds) * 1000000,
+                measure(parse_accept_language, header,
+                        options.rounds) * 1000000)
+
+
+if __name__ == '__main__':
+    main()
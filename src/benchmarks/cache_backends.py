@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+benchmark of the cache region backends
+
+A cache region is configured like in the application ini for each beaker
+backend - the in-process memory cache, file, dbm and ext:memcached, which
+runs against a local memcached stand-in. For each backend a working set of
+user contexts is read with a skewed access pattern, and the latency of the
+lookups and the hit, miss and eviction counters of the region are shown.
+The beaker file and dbm backends keep a namespace in one file, so they
+suit the small regions like pre_context and templates.
+
+    python benchmarks/cache_backends.py [--users N] [--lookups N] [--max-size N]
+"""
+
+import logging
+import optparse
+import random
+import shutil
+import tempfile
+import time
+
+from beaker.cache import CacheManager
+from beaker.util import parse_cache_config_options
+
+from stub_memcached import StubMemcached
+from linotpselfservice.lib.cache import CacheRegion
+
+
+def context_of(user):
+    """
+    a user context of the typical size
+    """
+    return {"user": user, "realm": "realm",
+            "actions": ["enroll", "assign", "resync", "reset", "setpin",
+                        "disable", "enable", "delete", "history"],
+            "tokenArray": [{"LinOtp.TokenSerialnumber": "LSGO%08d" % i,
+                            "LinOtp.TokenType": "HMAC",
+                            "LinOtp.Isactive": True} for i in range(3)],
+            "version": "LinOTP 2", "licenseinfo": ""}
+
+
+def measure(settings, users, lookups, max_size):
+    manager = CacheManager(**parse_cache_config_options(settings))
+    region = CacheRegion('bench', ttl=300, max_size=max_size)
+    region.configure(manager, manager.regions.get('bench'))
+
+    rand = random.Random(42)
+    start = time.time()
+    for _i in range(lookups):
+        # a few users are much more active than the others
+        user = 'user%d@realm' % int(users * rand.random() ** 3)
+        region.get_or_load(user, lambda: context_of(user))
+    latency = (time.time() - start) / lookups
+    return latency, region.stats()
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--users', type='int', default=500)
+    parser.add_option('--lookups', type='int', default=2000)
+    parser.add_option('--max-size', type='int', default=100,
+                      help='entries of the in-process cache')
+    options, _args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    memcached = StubMemcached().start()
+    data_dir = tempfile.mkdtemp()
+
+    backends = [
+        ('memory', {'beaker.cache.regions': 'bench',
+                    'beaker.cache.bench.max_size': str(options.max_size)}),
+        ('file', {'beaker.cache.regions': 'bench',
+                  'beaker.cache.bench.type': 'file',
+                  'beaker.cache.data_dir': data_dir + '/file'}),
+        ('dbm', {'beaker.cache.regions': 'bench',
+                 'beaker.cache.bench.type': 'dbm',
+                 'beaker.cache.data_dir': data_dir + '/dbm'}),
+        ('ext:memcached', {'beaker.cache.regions': 'bench',
+                           'beaker.cache.bench.type': 'ext:memcached',
+                           'beaker.cache.bench.url': memcached.url,
+                           'beaker.cache.lock_dir': data_dir + '/lock'}),
+        ]
+
+    print "%d users, %d lookups" % (options.users, options.lookups)
+    print "%14s %10s %8s %8s %10s" % ('backend', 'us/lookup', 'hits',
+                                      'misses', 'evictions')
+    try:
+        for name, settings in backends:
+            latency, stats = measure(settings, options.users,
+                                     options.lookups, options.max_size)
+            print "%14s %10.1f %8d %8d %10d" % (
+                    name, latency * 1000000, stats['hits'], stats['misses'],
+                    stats['evictions'])
+    finally:
+        memcached.stop()
+        shutil.rmtree(data_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+benchmark of the cold start of a worker process
+
+Every run starts a new interpreter, which loads the application from the
+development.ini - pointed at a stub LinOTP server - and serves the login
+page twice. The phases are timed:
+
+    imports         importing paste.deploy and the application module
+    make_app        loadapp, from the ini file to the WSGI application
+    first response  the first request, which loads the controller and
+                    compiles or loads its templates
+    next response   the same request once more
+
+With --report the imports of the slowest run are listed by the time spent
+in each module itself and including the modules it imports. The other
+options change the app section of the development.ini:
+
+    python benchmarks/cold_start.py [--runs N] [--report N]
+        [--use call:linotpselfservice.config.middleware:make_app]
+        [--no-full-stack] [--no-static-files]
+"""
+
+import ConfigParser
+import __builtin__
+import json
+import optparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ('imports', 'make_app', 'first response', 'next response')
+
+
+
+class ImportTimer(object):
+    """
+    records the time of every first import - including the imports it
+    triggers and by itself. The packages of a module, which are imported
+    along with it, are recorded together with the module, as their time
+    can not be told apart.
+    """
+
+    def __init__(self):
+        self.inclusive = {}
+        self.own = {}
+        self._stack = []
+        self._import = __builtin__.__import__
+
+    def install(self):
+        __builtin__.__import__ = self
+
+    def uninstall(self):
+        __builtin__.__import__ = self._import
+
+    def __call__(self, name, globals=None, locals=None, fromlist=None,
+                 level=-1):
+        parts = name.split('.')
+        new = [package for package in ('.'.join(parts[:i + 1])
+                                       for i in range(len(parts)))
+               if package not in sys.modules]
+        start = time.time()
+        self._stack.append(0.0)
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            nested = self._stack.pop()
+            spent = time.time() - start
+            if self._stack:
+                self._stack[-1] += spent
+            loaded = [package for package in new if package in sys.modules]
+            if loaded:
+                label = ' + '.join(loaded)
+                self.inclusive[label] = spent
+                self.own[label] = spent - nested
+
+
+def request(app, path):
+    from webob import Request
+    response = Request.blank(path, environ={'wsgi.url_scheme': 'https'}
+                             ).get_response(app)
+    return response.status_int
+
+
+def child(ini):
+    """
+    the measured worker - prints the timings as json
+    """
+    timer = ImportTimer()
+    timer.install()
+
+    timings = {}
+    start = time.time()
+    from paste.deploy import loadapp
+    import linotpselfservice.config.middleware
+    timings['imports'] = time.time() - start
+
+    start = time.time()
+    app = loadapp('config:' + ini)
+    timings['make_app'] = time.time() - start
+    modules_at_make_app = len(sys.modules)
+
+    start = time.time()
+    request(app, '/account/login')
+    timings['first response'] = time.time() - start
+
+    start = time.time()
+    request(app, '/account/login')
+    timings['next response'] = time.time() - start
+
+    timer.uninstall()
+    print json.dumps({'timings': timings,
+                      'modules': modules_at_make_app,
+                      'inclusive': timer.inclusive,
+                      'own': timer.own})
+
+
+def write_who_ini(tmp, url):
+    """
+    write the who.ini with the stub url into tmp - the plugin options have
+    to agree with the application ini
+    """
+    parser = ConfigParser.RawConfigParser()
+    parser.optionxform = str
+    parser.read(os.path.join(SRC, 'config', 'who.ini'))
+    for section in parser.sections():
+        if parser.has_option(section, 'linotp_url'):
+            parser.set(section, 'linotp_url', url)
+
+    who_ini = os.path.join(tmp, 'who.ini')
+    with open(who_ini, 'w') as ini_file:
+        parser.write(ini_file)
+    return who_ini
+
+
+def write_ini(tmp, url, options):
+    """
+    write the development.ini and the who.ini with the benchmark settings
+    into tmp
+    """
+    parser = ConfigParser.RawConfigParser()
+    parser.optionxform = str
+    parser.read(os.path.join(SRC, 'development.ini'))
+    parser.set('DEFAULT', 'debug', 'false')
+    settings = {'linotp_url': url,
+                'cache_dir': os.path.join(tmp, 'data'),
+                'who.config_file': write_who_ini(tmp, url),
+                'who.log_file': os.path.join(tmp, 'who.log')}
+    if options.use:
+        settings['use'] = options.use
+    if options.no_full_stack:
+        settings['full_stack'] = 'false'
+    if options.no_static_files:
+        settings['static_files'] = 'false'
+    for name, value in settings.items():
+        parser.set('app:main', name, value)
+
+    ini = os.path.join(tmp, 'cold_start.ini')
+    with open(ini, 'w') as ini_file:
+        parser.write(ini_file)
+    return ini
+
+
+def run_once(ini):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([SRC, env.get('PYTHONPATH', '')])
+    output = subprocess.check_output(
+                        [sys.executable, os.path.abspath(__file__),
+                         '--child', ini], env=env, cwd=SRC)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(result, count):
+    print
+    print "modules loaded by make_app: %d" % result['modules']
+    for title, key in (("imports by own time", 'own'),
+                       ("imports including their imports", 'inclusive')):
+        print
+        print "%-60s %8s" % (title, 'ms')
+        ranked = sorted(result[key].items(), key=lambda item: -item[1])
+        for name, spent in ranked[:count]:
+            print "%-60.60s %8.1f" % (name, spent * 1000)
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--runs', type='int', default=5)
+    parser.add_option('--report', type='int', default=0,
+                      help='list the N slowest imports')
+    parser.add_option('--use', help='how the app is loaded')
+    parser.add_option('--no-full-stack', action='store_true')
+    parser.add_option('--no-static-files', action='store_true')
+    parser.add_option('--child', help=optparse.SUPPRESS_HELP)
+    options, _args = parser.parse_args()
+
+    if options.child:
+        child(options.child)
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from stub_linotp import StubServer
+
+    server = StubServer().start()
+    tmp = tempfile.mkdtemp()
+    try:
+        ini = write_ini(tmp, server.url, options)
+
+        results = []
+        for _i in range(options.runs):
+            # every run compiles the templates again, as a new container
+            shutil.rmtree(os.path.join(tmp, 'data'), ignore_errors=True)
+            results.append(run_once(ini))
+    finally:
+        server.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print "%d cold starts, median ms" % options.runs
+    for phase in PHASES:
+        values = sorted(result['timings'][phase] for result in results)
+        print "%-16s %8.1f" % (phase, values[len(values) // 2] * 1000)
+    total = sorted(sum(result['timings'].values()) for result in results)
+    print "%-16s %8.1f" % ('total', total[len(total) // 2] * 1000)
+
+    if options.report:
+        slowest = max(results, key=lambda result: sum(
+                                            result['timings'].values()))
+        report(slowest, options.report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+benchmark of the compact storage of the per-user cache entries
+
+The user contexts of many users are stored in an in-process cache region,
+once as plain dicts and once compact. Each variant runs in its own process
+and reports the growth of the resident memory, the bytes the cache
+accounts for and the mean latency of a lookup.
+
+    python benchmarks/compact_cache.py [--users N] [--lookups N]
+"""
+
+import multiprocessing
+import optparse
+import random
+import time
+
+from linotpselfservice.lib.cache import TTLCache
+
+
+def context_of(user):
+    """
+    a user context as LinOTP returns it - the same policy actions and
+    settings for most users
+    """
+    return {u"user": user, u"realm": u"realm",
+            u"actions": [u"enroll", u"assign", u"resync", u"reset",
+                         u"setpin", u"disable", u"enable", u"delete",
+                         u"history", u"getserial", u"webprovisionGOOGLE"],
+            u"dynamic_actions": {u"hmac": u"Enroll HMAC",
+                                 u"totp": u"Enroll TOTP"},
+            u"tokenArray": [{u"LinOtp.TokenSerialnumber":
+                                u"LSGO%08d" % (hash(user) % 10 ** 8 + i),
+                             u"LinOtp.TokenType": u"HMAC",
+                             u"LinOtp.Isactive": True,
+                             u"LinOtp.FailCount": 0,
+                             u"LinOtp.TokenDesc": u"soft token"}
+                            for i in range(2)],
+            u"otplen": 6, u"totp_len": 6, u"imprint": u"",
+            u"version": u"LinOTP 2.7", u"licenseinfo": u""}
+
+
+def resident():
+    """
+    :return: the resident memory of the process in bytes
+    """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * 4096
+
+
+def run(compact, users, lookups, results):
+    cache = TTLCache('bench', max_size=users, compact=compact)
+    before = resident()
+    for i in range(users):
+        user = u'user%d@realm' % i
+        cache.set(user, context_of(user), ttl=3600)
+    grown = resident() - before
+
+    rand = random.Random(42)
+    start = time.time()
+    for _i in range(lookups):
+        cache.get(u'user%d@realm' % rand.randrange(users))
+    latency = (time.time() - start) / lookups
+    results.put((grown, cache.size_bytes(), latency))
+
+
+def measure(compact, users, lookups):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run, args=(compact, users,
+                                                        lookups, results))
+    process.start()
+    reply = results.get()
+    process.join()
+    return reply
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--users', type='int', default=100000)
+    parser.add_option('--lookups', type='int', default=100000)
+    options, _args = parser.parse_args()
+
+    print "%d users, %d lookups" % (options.users, options.lookups)
+    print "%8s %12s %14s %10s" % ('storage', 'resident MB', 'accounted MB',
+                                  'us/lookup')
+    for compact in (False, True):
+        grown, accounted, latency = measure(compact, options.users,
+                                            options.lookups)
+        print "%8s %12.1f %14s %10.1f" % (
+                'compact' if compact else 'plain', grown / 1048576.0,
+                '%.1f' % (accounted / 1048576.0) if accounted else '-',
+                latency * 1000000)
+
+
+if __name__ == '__main__':
+    main()
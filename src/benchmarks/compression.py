@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+
+"""
+benchmark of the compressed transport between selfservice and LinOTP
+
+A local stub LinOTP serves /userservice/history replies of different
+sizes with a limited bandwidth. For each size the bytes on the wire and
+the latency of the plain and the compressed transfer are compared, in
+buffered and in streaming mode.
+
+    python benchmarks/compression.py [--bandwidth BYTES/S] [--rounds N]
+"""
+
+import logging
+import optparse
+import time
+
+from stub_linotp import StubServer
+from linotpselfservice.lib.network import Connection
+from linotpselfservice.lib.network import response_sizes
+from linotpselfservice.lib.network import close_pools
+
+
+def measure(server, compression_threshold, rows, rounds, stream):
+    conn = Connection(server.url, compression_threshold=compression_threshold)
+    params = {'rp': str(rows), 'user': 'bench@realm'}
+
+    # reset the size statistics, so every run decides on its own
+    response_sizes._sizes.clear()
+
+    server.bytes_sent = 0
+    size = 0
+    start = time.time()
+    for _i in range(rounds):
+        response = conn.post('/userservice/history', params=params,
+                             stream=stream)
+        if stream:
+            size = sum(len(chunk) for chunk in response.iter_body())
+        else:
+            size = len(response.content())
+    latency = (time.time() - start) / rounds
+    return size, server.bytes_sent / rounds, latency
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--bandwidth', type='int', default=10 * 1024 * 1024,
+                      help='bandwidth of the stub in bytes/s, 0 = unlimited')
+    parser.add_option('--rounds', type='int', default=20)
+    options, _args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    server = StubServer(bandwidth=options.bandwidth).start()
+
+    print "bandwidth: %s bytes/s, %d rounds" % (options.bandwidth or
+                                               'unlimited', options.rounds)
+    print "%6s %6s %10s %10s %8s %10s %10s" % (
+            'rows', 'mode', 'body', 'plain', 'gzip', 'plain ms', 'gzip ms')
+
+    for rows in (1, 15, 100, 1000, 5000):
+        for stream in (False, True):
+            size, plain_bytes, plain_latency = measure(
+                    server, None, rows, options.rounds, stream)
+            _size, gzip_bytes, gzip_latency = measure(
+                    server, 0, rows, options.rounds, stream)
+            print "%6d %6s %10d %10d %8d %10.2f %10.2f" % (
+                    rows, 'stream' if stream else 'buffer', size,
+                    plain_bytes, gzip_bytes,
+                    plain_latency * 1000, gzip_latency * 1000)
+
+    close_pools()
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
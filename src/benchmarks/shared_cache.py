@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+benchmark of the cache regions shared between worker processes
+
+Several worker processes look up the user contexts of a common set of
+users, like the workers of a prefork deployment. A lookup, which misses
+the cache, costs one upstream call (simulated by a sleep). The per-process
+memory region is compared with the sqlite region shared by all workers:
+the upstream calls of all workers and the mean latency of the lookups.
+
+    python benchmarks/shared_cache.py [--workers N] [--users N]
+                                      [--lookups N] [--upstream MS]
+"""
+
+import multiprocessing
+import optparse
+import random
+import shutil
+import tempfile
+import time
+
+from linotpselfservice.lib.cache import CacheRegion
+from cache_backends import context_of
+
+
+def worker(settings, seed, users, lookups, upstream, results):
+    region = CacheRegion('bench', ttl=300, max_size=users)
+    region.configure(None, settings)
+
+    loads = []
+
+    def load(user):
+        loads.append(user)
+        time.sleep(upstream)
+        return context_of(user)
+
+    rand = random.Random(seed)
+    start = time.time()
+    for _i in range(lookups):
+        # a few users are much more active than the others
+        user = 'user%d@realm' % int(users * rand.random() ** 3)
+        region.get_or_load(user, lambda: load(user))
+    results.put((len(loads), time.time() - start))
+
+
+def measure(settings, workers, users, lookups, upstream):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker,
+                                         args=(settings, seed, users,
+                                               lookups, upstream, results))
+                 for seed in range(workers)]
+    for process in processes:
+        process.start()
+    replies = [results.get() for _process in processes]
+    for process in processes:
+        process.join()
+
+    loads = sum(reply[0] for reply in replies)
+    latency = sum(reply[1] for reply in replies) / (workers * lookups)
+    return loads, latency
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--workers', type='int', default=4)
+    parser.add_option('--users', type='int', default=500)
+    parser.add_option('--lookups', type='int', default=2000)
+    parser.add_option('--upstream', type='float', default=5.0,
+                      help='milliseconds of an upstream call')
+    options, _args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    backends = [
+        ('memory', {'type': 'memory'}),
+        ('sqlite', {'type': 'sqlite', 'data_dir': data_dir}),
+        ]
+
+    print "%d workers, %d users, %d lookups per worker, %.1fms upstream" % (
+            options.workers, options.users, options.lookups,
+            options.upstream)
+    print "%10s %14s %12s" % ('backend', 'upstream calls', 'ms/lookup')
+    try:
+        for name, settings in backends:
+            loads, latency = measure(settings, options.workers,
+                                     options.users, options.lookups,
+                                     options.upstream / 1000.0)
+            print "%10s %14d %12.3f" % (name, loads, latency * 1000)
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+
+"""
+minimal stand-in for the LinOTP /userservice interface, used by the
+benchmarks - it answers every request in a background thread of the
+calling process
+"""
+
+import BaseHTTPServer
+import SocketServer
+import gzip
+import json
+import threading
+import time
+import urlparse
+
+from StringIO import StringIO
+
+
+def history_reply(rows):
+    """
+    a /userservice/history reply with the given number of audit rows
+    """
+    return json.dumps({
+        "page": 1,
+        "total": rows,
+        "rows": [{"id": i,
+                  "cell": ["2015-03-01 12:%02d:%02d" % (i / 60 % 60, i % 60),
+                           "userservice/enroll", "1", "LSGO%08d" % i,
+                           "HMAC", "u@realm", "", "", "linotp-server"]}
+                 for i in range(rows)]})
+
+
+def reply_for(path, params):
+    if path == '/userservice/pre_context':
+        return json.dumps({"version": "LinOTP 2", "licenseinfo": "",
+                           "default_realm": "realm", "realm_box": True,
+                           "realms": json.dumps({"realm": {}}),
+                           "otpLogin": False})
+    if path == '/userservice/context':
+        return json.dumps({"user": params.get('user', ''),
+                           "actions": ["enroll", "history"],
+                           "version": "LinOTP 2", "licenseinfo": ""})
+    if path == '/userservice/history':
+        return history_reply(int(params.get('rp', 15)))
+    return json.dumps({"result": {"status": True, "value": True}})
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else ''
+        url = urlparse.urlparse(self.path)
+        params = dict(urlparse.parse_qsl(url.query))
+        params.update(urlparse.parse_qsl(body))
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        self.server.requests += 1
+        reply = reply_for(url.path, params)
+
+        encoding = None
+        accepted = self.headers.get('Accept-Encoding', '')
+        if 'gzip' in accepted:
+            buf = StringIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as gz:
+                gz.write(reply)
+            reply = buf.getvalue()
+            encoding = 'gzip'
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(reply)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.write_throttled(reply)
+
+    def write_throttled(self, data):
+        """
+        write the body with the bandwidth limit of the server
+        """
+        self.server.bytes_sent += len(data)
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        chunk = 16 * 1024
+        for pos in range(0, len(data), chunk):
+            part = data[pos:pos + chunk]
+            self.wfile.write(part)
+            time.sleep(len(part) / float(bandwidth))
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, delay=0, bandwidth=None):
+        """
+        :param port: port to listen on, 0 for any free port
+        :param delay: seconds each request is delayed
+        :param bandwidth: bytes per second of the response bodies
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port),
+                                           StubHandler)
+        self.delay = delay
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.bytes_sent = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
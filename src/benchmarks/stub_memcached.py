@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+
+"""
+minimal stand-in for a memcached server, used to run the ext:memcached
+cache regions without a memcached installation - it speaks the text
+protocol subset of the memcache clients: get, set, add, replace, delete,
+flush_all and version
+"""
+
+import SocketServer
+import threading
+import time
+
+
+class MemcachedHandler(SocketServer.StreamRequestHandler):
+
+    # replies are written buffered and flushed per command
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.split()
+            if not parts:
+                continue
+            command, args = parts[0], parts[1:]
+            handler = getattr(self, 'cmd_%s' % command, None)
+            if handler is None:
+                self.wfile.write('ERROR\r\n')
+                continue
+            handler(*args)
+            self.wfile.flush()
+
+    def cmd_get(self, *keys):
+        store = self.server.store
+        now = time.time()
+        with self.server.lock:
+            for key in keys:
+                entry = store.get(key)
+                if entry is None:
+                    continue
+                flags, expires, data = entry
+                if expires and expires <= now:
+                    del store[key]
+                    continue
+                self.wfile.write('VALUE %s %s %d\r\n%s\r\n' % (
+                                                key, flags, len(data), data))
+        self.wfile.write('END\r\n')
+
+    cmd_gets = cmd_get
+
+    def _store(self, mode, key, flags, exptime, size, noreply=None):
+        data = self.rfile.read(int(size) + 2)[:-2]
+        exptime = int(exptime)
+        expires = time.time() + exptime if exptime else 0
+        store = self.server.store
+        with self.server.lock:
+            if ((mode == 'add' and key in store) or
+                    (mode == 'replace' and key not in store)):
+                reply = 'NOT_STORED\r\n'
+            else:
+                store[key] = (flags, expires, data)
+                reply = 'STORED\r\n'
+        if noreply is None:
+            self.wfile.write(reply)
+
+    def cmd_set(self, *args):
+        self._store('set', *args)
+
+    def cmd_add(self, *args):
+        self._store('add', *args)
+
+    def cmd_replace(self, *args):
+        self._store('replace', *args)
+
+    def cmd_delete(self, key, *args):
+        with self.server.lock:
+            found = self.server.store.pop(key, None) is not None
+        if 'noreply' not in args:
+            self.wfile.write('DELETED\r\n' if found else 'NOT_FOUND\r\n')
+
+    def cmd_flush_all(self, *args):
+        with self.server.lock:
+            self.server.store.clear()
+        if 'noreply' not in args:
+            self.wfile.write('OK\r\n')
+
+    def cmd_version(self):
+        self.wfile.write('VERSION 1.4-stub\r\n')
+
+
+class StubMemcached(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        """
+        :param port: port to listen on, 0 for any free port
+        """
+        SocketServer.TCPServer.__init__(self, ('127.0.0.1', port),
+                                        MemcachedHandler)
+        self.lock = threading.Lock()
+        self.store = {}
+
+    @property
+    def url(self):
+        return '127.0.0.1:%d' % self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -27,11 +27,15 @@
 """Pylons environment configuration"""
 import os
 
-from mako.lookup import TemplateLookup
+from paste.deploy.converters import asbool
 from pylons.configuration import PylonsConfig
-from pylons.error import handle_mako_error
 
 import linotpselfservice.lib.app_globals as app_globals
+from linotpselfservice.lib.cache import configure_regions
+from linotpselfservice.lib.settings import Settings
+from linotpselfservice.lib.i18n import load_translators
+from linotpselfservice.lib.templates import make_template_lookup
+from linotpselfservice.lib.templates import PRECOMPILED_DIRECTORY
 import linotpselfservice.lib.helpers
 from linotpselfservice.config.routing import make_map
 
@@ -60,15 +64,31 @@ def load_environment(global_conf, app_conf):
     # Setup cache object as early as possible
     import pylons
     pylons.cache._push_object(config['pylons.app_globals'].cache)
+
+    # the cache regions for the LinOTP replies and the rendered forms
+    configure_regions(config['pylons.app_globals'].cache)
+
+    # the LinOTP connection settings are checked once at startup and
+    # shared read only by all controllers
+    config['pylons.app_globals'].settings = Settings.from_config(
+                                        app_conf, here=global_conf.get('here'))
+
+    # the translators of all languages, loaded once for all requests
+    config['pylons.app_globals'].translators = load_translators(
+                                        os.path.join(root, 'i18n'),
+                                        config['pylons.package'])
     
 
-    # Create the Mako TemplateLookup, with the default auto-escaping
-    config['pylons.app_globals'].mako_lookup = TemplateLookup(
-        directories=paths['templates'],
-        error_handler=handle_mako_error,
-        module_directory=os.path.join(app_conf['cache_dir'], 'templates'),
-        input_encoding='utf-8', default_filters=['escape'],
-        imports=['from webhelpers.html import escape'])
+    # Create the Mako TemplateLookup, with the default auto-escaping - the
+    # templates are either compiled on first use or loaded precompiled
+    # from a read only directory
+    read_only = asbool(app_conf.get('templates.read_only', False))
+    module_directory = app_conf.get('templates.module_directory')
+    if not module_directory:
+        module_directory = (PRECOMPILED_DIRECTORY if read_only else
+                            os.path.join(app_conf['cache_dir'], 'templates'))
+    config['pylons.app_globals'].mako_lookup = make_template_lookup(
+        paths['templates'], module_directory, read_only=read_only)
 
     # CONFIGURATION OPTIONS HERE (note: all config options will override
     # any Pylons config options)
@@ -24,26 +24,19 @@
 #    Support: www.lsexperts.de
 #
 
-"""Pylons middleware initialization"""
+"""Pylons middleware initialization
+
+The optional middlewares are imported by make_app only, if they are
+enabled - the controllers are imported by Pylons on their first request.
+"""
 from beaker.middleware import SessionMiddleware
-from paste.cascade import Cascade
 from paste.registry import RegistryManager
-from paste.urlparser import StaticURLParser
 from paste.deploy.converters import asbool
-from pylons.middleware import ErrorHandler, StatusCodeRedirect
 from pylons.wsgiapp import PylonsApp
 from routes.middleware import RoutesMiddleware
 
 from linotpselfservice.config.environment import load_environment
 
-repoze_load = False
-try:
-    from repoze.who.config import make_middleware_with_config as make_who_with_config
-    repoze_load = True
-except ImportError:
-    # could not load repoze
-    pass
-
 
 
 def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
@@ -82,6 +75,8 @@ def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
     # CUSTOM MIDDLEWARE HERE (filtered by error handling middlewares)
 
     if asbool(full_stack):
+        from pylons.middleware import ErrorHandler, StatusCodeRedirect
+
         # Handle Python exceptions
         app = ErrorHandler(app, global_conf, **config['pylons.errorware'])
 
@@ -96,10 +91,21 @@ def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
     app = RegistryManager(app)
 
     if asbool(static_files):
+        from paste.cascade import Cascade
+        from paste.urlparser import StaticURLParser
+
         # Serve static files
         static_app = StaticURLParser(config['pylons.paths']['static_files'])
         app = Cascade([static_app, app])
 
+    repoze_load = False
+    try:
+        from repoze.who.config import make_middleware_with_config as make_who_with_config
+        repoze_load = True
+    except ImportError:
+        # could not load repoze
+        pass
+
     if repoze_load == True:
         app = make_who_with_config(app, global_conf, 
                                app_conf['who.config_file'], 
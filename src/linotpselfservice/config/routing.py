@@ -56,5 +56,10 @@ def make_map(config, global_conf, app_conf):
             routeMap.connect('/%s/{action}' % cont , controller=cont)
             routeMap.connect('/%s/{action}/{id}' % cont, controller=cont)
 
+    # the monitor is unauthenticated and therefore has to be enabled
+    monitor = app_conf.get('service.monitor', 'False') == 'True'
+    if monitor:
+        routeMap.connect('/monitor/{action}', controller='monitor')
+
 
     return routeMap
@@ -32,6 +32,8 @@ account controller - used for loggin in to the selfservice
 import traceback
 import requests
 
+from string import Template
+
 from pylons import request, response, tmpl_context as c
 from pylons.controllers.util import abort, redirect
 from pylons.templating import render_mako as render
@@ -42,6 +44,7 @@ from mako.exceptions import TopLevelLookupException
 from linotpselfservice.lib.base import (BaseController,
                                         InvalidLinOTPResponse
                                         )
+from linotpselfservice.lib.cache import error_cache
 
 import json
 import logging
@@ -96,18 +99,8 @@ class AccountController(BaseController):
             c.error = (_("Invalid linotp response: %r") % err.url)
             c.status = ("%s: %s" % (err.reason, err.url))
 
-            webException = webob.exc.HTTPServiceUnavailable()
-            # templating for the connection error:
-            # hard overwrite the default html content of the webob.exception
-            # as described in documented in webob 8-/
-            try:
-                from string import Template
-                body = render('/selfservice/error.mako')
-                webException.html_template_obj = Template(body)
-            except TopLevelLookupException as exx:
-                log.error("Template lookup error %r", exx)
-
-            raise webException
+            raise self._service_unavailable('response',
+                                            status_code=err.status_code)
 
         except webob.exc.HTTPUnauthorized as acc:
             # the exception, when an abort() is called if forwarded
@@ -133,18 +126,7 @@ class AccountController(BaseController):
             except AttributeError as exx:
                 c.status = c.error
 
-            webException = webob.exc.HTTPServiceUnavailable()
-            # templating for the connection error:
-            # hard overwrite the default html content of the webob.exception
-            # as described in documented in webob 8-/
-            try:
-                from string import Template
-                body = render('/selfservice/error.mako')
-                webException.html_template_obj = Template(body)
-            except TopLevelLookupException as exx:
-                log.error("Template lookup error %r", exx)
-
-            raise webException
+            raise self._service_unavailable('connection')
 
         except Exception as exx:
             log.error("[__before__::%r] exception %r" % (action, exx))
@@ -154,6 +136,38 @@ class AccountController(BaseController):
         finally:
             log.debug("[__before__::%r] done" % (action))
 
+    def _service_unavailable(self, kind, status_code=None):
+        """
+        the 503 response for a LinOTP outage - the error document is only
+        rendered once per negotiated language, error code, kind of failure
+        and class of the LinOTP status and the client is asked to retry,
+        when the circuit breaker tries LinOTP again
+
+        :param kind: the kind of failure - 'connection' or 'response'
+        :param status_code: the http status of the LinOTP response
+        :return: the webob.exc.HTTPServiceUnavailable exception
+        """
+        retry_after = int(self.settings.breaker_args['reset_timeout'])
+        webException = webob.exc.HTTPServiceUnavailable(
+                                headers=[('Retry-After', str(retry_after))])
+
+        status_class = status_code // 100 if status_code else None
+        key = (self.language, c.code, kind, status_class)
+        body = error_cache.get(key)
+        if body is None:
+            try:
+                body = render('/selfservice/error.mako')
+            except TopLevelLookupException as exx:
+                log.error("Template lookup error %r", exx)
+                return webException
+            error_cache.set(key, body)
+
+        # templating for the connection error:
+        # hard overwrite the default html content of the webob.exception
+        # as described in documented in webob 8-/
+        webException.html_template_obj = Template(body)
+        return webException
+
     def login(self):
         """
         check for successfull authentication - or redirect to the login again
@@ -205,9 +219,12 @@ class AccountController(BaseController):
             c.realmbox = self.context["realm_box"]
             log.debug("[login] displaying realmbox: %i" % int(c.realmbox))
             if c.realmbox == True:
-                realms = json.loads(self.context["realms"])
-                for (k, v) in realms.items():
-                    c.realmArray.append(k)
+                if self.realms is not None:
+                    c.realmArray.extend(self.realms)
+                else:
+                    realms = json.loads(self.context["realms"])
+                    for (k, v) in realms.items():
+                        c.realmArray.append(k)
 
             response.status = '%i Logout from LinOTP selfservice' % LOGIN_CODE
             return render('/selfservice/login.mako')
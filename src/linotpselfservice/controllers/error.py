@@ -26,7 +26,6 @@
 
 import cgi
 
-from paste.urlparser import PkgResourcesParser
 from pylons.middleware import error_document_template
 from webhelpers.html.builder import literal
 
@@ -65,6 +64,9 @@ class ErrorController(BaseController):
         """Call Paste's FileApp (a WSGI application) to serve the file
         at the specified path
         """
+        # only needed for the stock media of the debug error pages
+        from paste.urlparser import PkgResourcesParser
+
         request = self._py_object.request
         request.environ['PATH_INFO'] = '/%s' % path
         return PkgResourcesParser('pylons', 'pylons')(request.environ, self.start_response)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+
+"""
+monitor controller - state of the connection to the LinOTP servers
+"""
+
+import json
+import logging
+
+from pylons import response
+from pylons.controllers import WSGIController
+
+from linotpselfservice.lib.cache import region_stats
+from linotpselfservice.lib.network import breaker_states
+from linotpselfservice.lib.singleflight import upstream_flights
+
+log = logging.getLogger(__name__)
+
+
+class MonitorController(WSGIController):
+    '''
+    The MonitorController
+        /monitor/
+    provides the internal state of the selfservice for monitoring systems.
+    It does not contact LinOTP and requires no authentication, thus it is
+    only routed if 'service.monitor' is enabled in the application ini.
+        /monitor/breaker
+        /monitor/coalescing
+        /monitor/cache
+    '''
+
+    def breaker(self):
+        '''
+        return the state of the circuit breakers in front of LinOTP
+        '''
+        response.content_type = 'application/json'
+        return json.dumps({'breakers': breaker_states()})
+
+    def coalescing(self):
+        '''
+        return the number of upstream calls and of the requests, which
+        shared a running call, per LinOTP endpoint
+        '''
+        response.content_type = 'application/json'
+        return json.dumps({'coalescing': upstream_flights.stats()})
+
+    def cache(self):
+        '''
+        return the backend, size, hits, misses and evictions per cache
+        region
+        '''
+        response.content_type = 'application/json'
+        return json.dumps({'cache': region_stats()})
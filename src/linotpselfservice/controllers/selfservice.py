@@ -24,6 +24,8 @@
 #    Support: www.lsexperts.de
 #
 
+import hashlib
+
 try:
     import json
 except ImportError:
@@ -31,10 +33,13 @@ except ImportError:
 
 from pylons import request, response, config, tmpl_context as c
 from pylons.controllers.util import abort
+from pylons.controllers.util import etag_cache
 from pylons.templating import render_mako as render
 
 from linotpselfservice.lib.util import check_selfservice_session
 from linotpselfservice.lib.base import BaseController
+from linotpselfservice.lib.cache import form_cache
+from linotpselfservice.lib.cache import render_cache
 
 from pylons.i18n.translation import _
 
@@ -64,6 +69,14 @@ def copy_context_(context):
 
     return
 
+def form_etag(form):
+    """
+    :return: the strong entity tag of the form html
+    """
+    if isinstance(form, unicode):
+        form = form.encode('utf-8')
+    return hashlib.sha1(form).hexdigest()
+
 class SelfserviceController(BaseController):
     """
     the selfservice controller is the one that
@@ -115,24 +128,84 @@ class SelfserviceController(BaseController):
         retrieve the form data eg. for token enrollment
 
         the load_form rendering context is rebuild on the LinOTP server side
-        from the provided user context
+        from the provided user context - the forms are small and requested
+        concurrently by the tabs, so identical requests share one call.
+        The forms are cached and revalidated by the browser with their ETag
         '''
         params = {}
         reply = {}
+        cached = None
         try:
-            params.update(request.params)
             params['user'] = self.userid
 
-            reply = self.call_linotp('/userservice/load_form',
-                                     params=params, return_json=False)
+            key = self._form_key()
+            if key is not None:
+                cached = form_cache.get(key)
+
+            if cached is None:
+                reply = self.call_linotp('/userservice/load_form',
+                                         params=params, return_json=False,
+                                         forward_request=True, coalesce=True)
+                cached = (form_etag(reply), reply)
+                if key is not None:
+                    form_cache.set(key, cached)
 
         except Exception as exx:
             log.error("failed to call remote service: %r" % exx)
             self.sendError(response, "%r" % exx)
+            return reply
+
+        etag, reply = cached
+        # raises 304 Not Modified, if the browser has got the form already
+        etag_cache(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
 
         # the reply shoud be of type html
         return reply
 
+    def _form_key(self):
+        '''
+        the cache key of the requested form - the form depends on the token
+        type, the language and the actions the policies grant to the user
+
+        :return: the key or None, if the request can not be cached
+        '''
+        if set(request.params.keys()) - set(['type', 'session']):
+            return None
+
+        scope = (repr(self.userid),
+                 repr(sorted(self.context.get('actions') or [])),
+                 repr(sorted((self.context.get('dynamic_actions') or {})
+                             .items())))
+        return (hashlib.sha1('|'.join(scope)).hexdigest(),
+                request.params.get('type'), self.language)
+
+    def _render_form(self, template, context_keys=()):
+        '''
+        render a static form, which only depends on the language and the
+        given context values - the rendered form is cached and revalidated
+        by the browser with its ETag
+
+        :param template: the mako template
+        :param context_keys: the attributes of c the template reads
+        :return: the rendered form
+        '''
+        values = repr([getattr(c, key, None) for key in context_keys])
+        key = (template, self.language,
+               hashlib.sha1(values).hexdigest())
+
+        cached = render_cache.get(key)
+        if cached is None:
+            form = render(template)
+            cached = (form_etag(form), form)
+            render_cache.set(key, cached)
+
+        etag, form = cached
+        # raises 304 Not Modified, if the browser has got the form already
+        etag_cache(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return form
+
     def custom_style(self):
         '''
         In case the user hasn't defined a custom css, Pylons calls this action.
@@ -147,54 +220,55 @@ class SelfserviceController(BaseController):
         In this form the user may assign an already existing Token to himself.
         For this, the user needs to know the serial number of the Token.
         '''
-        return render('/selfservice/assign.mako')
+        return self._render_form('/selfservice/assign.mako',
+                                 context_keys=('actions',))
 
     def resync(self):
         '''
         In this form, the user can resync an HMAC based OTP token
         by providing two OTP values
         '''
-        return render('/selfservice/resync.mako')
+        return self._render_form('/selfservice/resync.mako')
 
     def reset(self):
         '''
         In this form the user can reset the Failcounter of the Token.
         '''
-        return render('/selfservice/reset.mako')
+        return self._render_form('/selfservice/reset.mako')
 
     def getotp(self):
         '''
         In this form, the user can retrieve OTP values
         '''
-        return render('/selfservice/getotp.mako')
+        return self._render_form('/selfservice/getotp.mako')
 
     def disable(self):
         '''
         In this form the user may select a token of his own and
         disable this token.
         '''
-        return render('/selfservice/disable.mako')
+        return self._render_form('/selfservice/disable.mako')
 
     def enable(self):
         '''
         In this form the user may select a token of his own and
         enable this token.
         '''
-        return render('/selfservice/enable.mako')
+        return self._render_form('/selfservice/enable.mako')
 
     def unassign(self):
         '''
         In this form the user may select a token of his own and
         unassign this token.
         '''
-        return render('/selfservice/unassign.mako')
+        return self._render_form('/selfservice/unassign.mako')
 
     def delete(self):
         '''
         In this form the user may select a token of his own and
         delete this token.
         '''
-        return render('/selfservice/delete.mako')
+        return self._render_form('/selfservice/delete.mako')
 
 
     def setpin(self):
@@ -202,7 +276,7 @@ class SelfserviceController(BaseController):
         In this form the user may set the OTP PIN, which is the static password
         he enters when logging in in front of the otp value.
         '''
-        return render('/selfservice/setpin.mako')
+        return self._render_form('/selfservice/setpin.mako')
 
     def setmpin(self):
         '''
@@ -210,13 +284,13 @@ class SelfserviceController(BaseController):
         token on his phone. This is the pin, he needs to enter on his phone,
         before a otp value will be generated.
         '''
-        return render('/selfservice/setmpin.mako')
+        return self._render_form('/selfservice/setmpin.mako')
 
     def history(self):
         '''
         This is the form to display the history table for the user
         '''
-        return render('/selfservice/history.mako')
+        return self._render_form('/selfservice/history.mako')
 
     def webprovisionoathtoken(self):
         '''
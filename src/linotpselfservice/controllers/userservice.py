@@ -31,9 +31,6 @@ except ImportError:
 
 
 
-from paste.urlparser import PkgResourcesParser
-from pylons.middleware import error_document_template
-from webhelpers.html.builder import literal
 from pylons import request, response, config, tmpl_context as c
 from pylons.controllers.util import abort
 from pylons.templating import render_mako as render
@@ -41,6 +38,8 @@ from pylons.templating import render_mako as render
 from linotpselfservice.lib.util import check_selfservice_session
 from linotpselfservice.lib.base import BaseController
 from linotpselfservice.lib.base import SessionExpiratioException
+from linotpselfservice.lib.base import linotp_unavailable
+from linotpselfservice.lib.cache import history_cache
 
 from pylons.i18n.translation import _
 
@@ -48,6 +47,13 @@ from pylons.i18n.translation import _
 import logging
 log = logging.getLogger(__name__)
 
+# actions, which change the tokens of the user and thus the user context
+MUTATING_ACTIONS = set([
+    'enable', 'disable', 'delete', 'reset', 'setpin', 'setmpin', 'resync',
+    'assign', 'unassign', 'enroll', 'webprovision', 'activateocratoken',
+    'finshocra2token', 'finshocratoken', 'token_call',
+    ])
+
 class UserserviceController(BaseController):
     """
     the Userservice controller is the proxy for the remote user selfservice
@@ -75,16 +81,21 @@ class UserserviceController(BaseController):
             if check_selfservice_session(request) == False:
                 abort(401, _("No valid session"))
 
+    def __after__(self, action, **params):
+        # the token list must not be served from the cached context after
+        # the tokens have been changed
+        if action in MUTATING_ACTIONS and response.status_int == 200:
+            self.invalidate_context(self.userid)
+
     def enable(self):
         '''
         '''
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/enable',
-                                     params=params)
+            return self.proxy_linotp('/userservice/enable',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
@@ -101,10 +112,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/disable',
-                                     params=params)
+            return self.proxy_linotp('/userservice/disable',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
@@ -121,10 +131,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/delete',
-                                     params=params)
+            return self.proxy_linotp('/userservice/delete',
+                                     params=params, forward_request=True)
 
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
@@ -142,10 +151,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/reset',
-                                     params=params)
+            return self.proxy_linotp('/userservice/reset',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
@@ -162,10 +170,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/setpin',
-                                     params=params)
+            return self.proxy_linotp('/userservice/setpin',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
@@ -182,10 +189,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/setmpin',
-                                     params=params)
+            return self.proxy_linotp('/userservice/setmpin',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
@@ -202,10 +208,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/resync',
-                                     params=params)
+            return self.proxy_linotp('/userservice/resync',
+                                     params=params, forward_request=True)
 
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
@@ -223,10 +228,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/assign',
-                                     params=params)
+            return self.proxy_linotp('/userservice/assign',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
@@ -243,10 +247,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/unassign',
-                                     params=params)
+            return self.proxy_linotp('/userservice/unassign',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
@@ -264,10 +267,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/enroll',
-                                     params=params)
+            return self.proxy_linotp('/userservice/enroll',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
         except Exception as exx:
@@ -283,10 +285,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/webprovision',
-                                     params=params)
+            return self.proxy_linotp('/userservice/webprovision',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
         except Exception as exx:
@@ -302,10 +303,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/getmultiotp',
-                                     params=params)
+            return self.proxy_linotp('/userservice/getmultiotp',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
         except Exception as exx:
@@ -321,10 +321,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/getSerialByOtp',
-                                     params=params)
+            return self.proxy_linotp('/userservice/getSerialByOtp',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
         except Exception as exx:
@@ -336,14 +335,31 @@ class UserserviceController(BaseController):
 
     def history(self):
         '''
+        the history might be large, so it is streamed through to the client -
+        unless the history pages are cached
         '''
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/history',
-                                     params=params)
+            if not history_cache.ttl:
+                return self.stream_linotp('/userservice/history',
+                                          params=params, forward_request=True)
+
+            # the page is cached per user session and query - the key
+            # changes with the generation of the user context, when the
+            # tokens of the user are changed
+            query = sorted((key, value) for key, value in
+                           request.params.items() if key != 'session')
+            key = self._context_key(self.userid) + (tuple(query),)
+            reply = history_cache.get_or_load(
+                            key, lambda: self.proxy_linotp(
+                                                '/userservice/history',
+                                                params=params,
+                                                forward_request=True),
+                            unavailable=linotp_unavailable)
+            response.content_type = 'application/json'
+            return reply
 
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
@@ -361,10 +377,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/activateocratoken',
-                                     params=params)
+            return self.proxy_linotp('/userservice/activateocratoken',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
         except Exception as exx:
@@ -380,10 +395,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/finshocra2token',
-                                     params=params)
+            return self.proxy_linotp('/userservice/finshocra2token',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
         except Exception as exx:
@@ -399,10 +413,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/finshocratoken',
-                                     params=params)
+            return self.proxy_linotp('/userservice/finshocratoken',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
@@ -419,10 +432,9 @@ class UserserviceController(BaseController):
         params = {}
         reply = {}
         try:
-            params.update(request.params)
             params['user'] = self.userid
-            reply = self.call_linotp('/userservice/token_call',
-                                     params=params)
+            return self.proxy_linotp('/userservice/token_call',
+                                     params=params, forward_request=True)
         except SessionExpiratioException as exx:
             abort(401, _("No valid session"))
 
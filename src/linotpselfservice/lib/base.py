@@ -32,16 +32,25 @@ Provides the BaseController class for subclassing.
 from pylons import request, response, tmpl_context as c
 
 from pylons.controllers import WSGIController
-from pylons.i18n.translation import set_lang
-from pylons.i18n import LanguageError
 
 from linotpselfservice.config.environment import app_config
 from linotpselfservice.lib.util import get_version
 from linotpselfservice.lib.network import Connection
+from linotpselfservice.lib.singleflight import upstream_flights
+from linotpselfservice.lib.cache import preauth_cache
+from linotpselfservice.lib.cache import context_cache
+from linotpselfservice.lib.cache import userinfo_cache
+from linotpselfservice.lib.cache import history_cache
+from linotpselfservice.lib.cache import new_generation
+from linotpselfservice.lib.cache import DEFAULT_REFRESH_AHEAD
+from linotpselfservice.lib.cache import transport_error
+from linotpselfservice.lib.network import merge_form
+from linotpselfservice.lib.network import FORM_CONTENT_TYPE
+from linotpselfservice.lib.i18n import negotiate_language
+from linotpselfservice.lib.i18n import install_translator
+from linotpselfservice.lib.i18n import DEFAULT_LANGUAGE
 
 import json
-import re
-import os
 
 import traceback
 import logging
@@ -49,10 +58,6 @@ import logging
 
 log = logging.getLogger(__name__)
 
-# HTTP-ACCEPT-LANGUAGE strings are in the form of i.e.
-# de-DE, de; q=0.7, en; q=0.3
-accept_language_regexp = re.compile(r'\s*([^\s;,]+)\s*[;\s*q=[0-9.]*]?\s*,?')
-
 
 class InvalidLinOTPResponse(Exception):
     """
@@ -78,6 +83,23 @@ class SessionExpiratioException(Exception):
 
         super(SessionExpiratioException, self).__init__(self)
 
+
+def linotp_unavailable(exx):
+    """
+    tell if a request failed, because LinOTP is not available - a cached
+    reply may be served then. An expired session and the 4xx errors are
+    not covered, they have to reach the caller.
+
+    :param exx: the exception of the request
+    :return: True for transport errors, an open circuit and 5xx replies
+    """
+    if isinstance(exx, SessionExpiratioException):
+        return False
+    if isinstance(exx, InvalidLinOTPResponse):
+        return exx.status_code is not None and exx.status_code // 100 == 5
+    return transport_error(exx)
+
+
 class BaseController(WSGIController):
 
     def __call__(self, environ, start_response):
@@ -92,6 +114,7 @@ class BaseController(WSGIController):
     def __init__(self, *args, **kw):
 
         self.context = {}
+        self.realms = None
 
         self.conn = None
         self.request = request
@@ -102,79 +125,38 @@ class BaseController(WSGIController):
         self.parent.__init__(*args, **kw)
 
         self.config = app_config['app_conf']
-        self.here = app_config['here']
         self.browser_language = request.headers.get('Accept-Language', None)
 
-        try:
-            self.base_url = self.config['linotp_url']
-            #trim trailing slashes
-            while self.base_url[-1] == '/':
-                self.base_url = self.base_url[:-1]
-        except KeyError:
-            raise Exception("Missing definition of remote linotp url"
-                            " in application ini: linotp_url")
-
-        # load keyfile
-        client_key = self.config.get('client_key', None)
-        self.client_key = None
-        # replace the app root %here% if any
-        if client_key and '%(here)s' in client_key:
-            client_key = client_key.replace('%(here)s', self.here)
-
-        if client_key:
-            if os.path.exists(client_key):
-                self.client_key = client_key
-            else:
-                log.error("key_file %s could not be found", client_key)
-
-        # load the client certificate file
-        client_cert = self.config.get('client_cert', None)
-        self.client_cert = None
-        # replace the app root %here% if any
-        if client_cert and '%(here)s' in client_cert:
-            client_cert = client_cert.replace('%(here)s', self.here)
-
-        if client_cert:
-            if os.path.exists(client_cert):
-                self.client_cert = client_cert
-            else:
-                log.error("cert_file %s could not be found", client_cert)
-
-        # load the server certificate file
-        server_cert = self.config.get('server_cert', None)
-        self.server_cert = None
-        # replace the app root %here% if any
-        if server_cert and '%(here)s' in server_cert:
-            server_cert = server_cert.replace('%(here)s', self.here)
-
-        if server_cert:
-            if os.path.exists(server_cert):
-                self.server_cert = server_cert
-            else:
-                log.error("cert_file %s could not be found", server_cert)
-
-        self.remote_base = self.config.get('linotp_remote_base', '/userservice')
+        # the connection settings are read and checked once at startup
+        self.settings = app_config['pylons.app_globals'].settings
 
         return
 
-    def call_linotp(self, url, params=None, return_json=True):
+    def call_linotp(self, url, params=None, return_json=True, deadline=None,
+                    stream=False, forward_request=False, coalesce=False):
         """
         make a http request to the linotp server
 
         :param url: the path of the linotp resource
         :param params: dict with request parameters
         :param return_json: bool, response should already be a json loaded obj
+        :param deadline: seconds the request may take including retries,
+                         defaults to the configured linotp_deadline
+        :param stream: bool, return the network Response with the unread
+                       body instead of the content
+        :param forward_request: bool, forward the parameters of the incoming
+                       request - the urlencoded form is passed on as it is
+                       and only the given params are added or replaced
+        :param coalesce: bool, share the reply with identical requests of
+                       other threads, which are running at the same time -
+                       only for read requests, the reply must not be changed
 
         :return: return the response of the request as dict or as plain text
 
         """
         if not self.conn:
-            self.conn = Connection(
-                self.base_url,
-                server_cert=self.server_cert,
-                client_cert=self.client_cert,
-                client_key=self.client_key
-                )
+            self.conn = Connection(list(self.settings.base_urls),
+                                   **self.settings.connection_args())
 
         if params is None:
             params = {}
@@ -183,48 +165,161 @@ class BaseController(WSGIController):
                    "Accept": "text/plain",
                    }
 
-        # for locale support, we copy the incomming languege settings
-        if self.browser_language:
-            headers['Accept-Language'] = self.browser_language
+        # for locale support, we pass on the negotiated language - the
+        # replies are then in the language of the page and can be cached
+        # per language instead of per raw client header
+        headers['Accept-Language'] = self.language
 
-        if not self.conn.is_user_session_set:
-            # if we are requesting for a user, provide the user auth cookie
-            if 'user' in params:
-                if hasattr(self, 'auth_cookie') and self.auth_cookie:
-                    self.conn.set_user_session(self.auth_cookie, params['user'])
+        # if we are requesting for a user, provide the user auth cookie
+        session = None
+        if 'user' in params:
+            if hasattr(self, 'auth_cookie') and self.auth_cookie:
+                session = self.auth_cookie
 
         path = url
 
+        form = None
+        if forward_request:
+            form = self.get_request_form()
+            if form is None:
+                # no urlencoded request - take the decoded parameters
+                request_params = dict(request.params)
+                request_params.update(params)
+                params = request_params
+
         if 'session' in params:
             # If a session is contained in params it is the local selfservice
             # session (between the browser and this server) not the session
             # between selfservice and LinOTP. Therefore we delete it. The
-            # selfservice->LinOTP session has already been set with
-            # 'self.conn.set_user_session'
+            # selfservice->LinOTP session is passed in with the request
             del params['session']
 
-        net_response = self.conn.post(path, params=params, headers=headers)
+        if form:
+            form = merge_form(form, exclude=['session'])
+
+        if coalesce and not stream:
+            key = (path, session, self.language, form,
+                   tuple(sorted(params.items())), return_json)
+            return upstream_flights.do(
+                        path, key,
+                        lambda: self._post_linotp(path, params, headers,
+                                                  session, deadline, stream,
+                                                  form, return_json))
+
+        return self._post_linotp(path, params, headers, session, deadline,
+                                 stream, form, return_json)
+
+    def _post_linotp(self, path, params, headers, session, deadline, stream,
+                     form, return_json):
+        """
+        send the request prepared by call_linotp and check the response
+        """
+        net_response = self.conn.post(path, params=params, headers=headers,
+                                      session=session, deadline=deadline,
+                                      stream=stream, form=form)
+
+        if net_response.deadline_used is not None:
+            log.debug("%s took %.3fs in %d attempt(s) - %d%% of the deadline",
+                      path, net_response.elapsed, net_response.attempts,
+                      net_response.deadline_used * 100)
 
         if net_response.status_code != 200:
-            error = "%s%s: %s - %s" % (self.config.get('linotp_url', ''), path,
+            net_response.close()
+            error = "%s%s: %s - %s" % (self.settings.linotp_url, path,
                                        net_response.status_code,
                                        net_response.reason)
             log.error(error)
             if net_response.reason == "Logout from LinOTP selfservice":
+                self.forget_session()
                 raise SessionExpiratioException(error,
-                                        url=self.config.get('linotp_url', ''),
+                                        url=self.settings.linotp_url,
                                         path=path,
                                         status_code=net_response.status_code,
                                         reason=net_response.reason)
 
             raise InvalidLinOTPResponse(error,
-                                        url=self.config.get('linotp_url', ''),
+                                        url=self.settings.linotp_url,
                                         path=path,
                                         status_code=net_response.status_code,
                                         reason=net_response.reason)
 
+        if stream:
+            return net_response
+
         return net_response.json() if return_json else net_response.text()
 
+    def get_request_form(self):
+        """
+        get the parameters of the incoming request as urlencoded form - the
+        query string joined with the body of an urlencoded POST request
+
+        :return: urlencoded string or None, if the body is not urlencoded
+        """
+        form = [request.environ.get('QUERY_STRING', '')]
+
+        if request.method == 'POST':
+            content_type = request.environ.get('CONTENT_TYPE', '')
+            if content_type.split(';')[0].strip() != FORM_CONTENT_TYPE:
+                return None
+            form.append(request.body)
+
+        return '&'.join(part for part in form if part)
+
+    def proxy_linotp(self, url, params=None, deadline=None,
+                     forward_request=False):
+        """
+        forward the json response of the linotp server as it is, without
+        parsing and re-serializing it. Only if LinOTP does not declare the
+        reply as json, it is parsed to verify it - an invalid reply raises
+        a ValueError as before.
+
+        :param url: the path of the linotp resource
+        :param params: dict with request parameters
+        :param deadline: seconds the request may take including retries
+
+        :param forward_request: bool, forward the incoming request parameters
+
+        :return: the json document as byte string
+        """
+        net_response = self.call_linotp(url, params=params, deadline=deadline,
+                                        stream=True,
+                                        forward_request=forward_request)
+        body = net_response.content()
+        # the streamed body is not recorded by the connection - the size
+        # decides, if the replies of the path are requested compressed
+        net_response.record_size(len(body))
+
+        content_type = net_response.content_type or ''
+        if 'json' not in content_type.lower():
+            log.debug("%s replied with %r - verifying the json reply",
+                      url, content_type)
+            json.loads(body)
+
+        response.content_type = 'application/json'
+        return body
+
+    def stream_linotp(self, url, params=None, deadline=None,
+                      forward_request=False):
+        """
+        proxy the response of the linotp server without buffering it: the
+        body is copied chunk by chunk into the WSGI response iterator and
+        the content type including the charset is taken over
+
+        :param url: the path of the linotp resource
+        :param params: dict with request parameters
+        :param deadline: seconds the request may take including retries
+        :param forward_request: bool, forward the incoming request parameters
+
+        :return: iterator over the response body
+        """
+        net_response = self.call_linotp(url, params=params, deadline=deadline,
+                                        stream=True,
+                                        forward_request=forward_request)
+        if net_response.content_type:
+            response.headers['Content-Type'] = net_response.content_type
+
+        return net_response.iter_body(self.settings.stream_chunk_size)
+
 
     def get_preauth_context(self, params=None):
         """
@@ -233,7 +328,27 @@ class BaseController(WSGIController):
         if params is None:
             params = {}
 
-        context = self.call_linotp('/userservice/pre_context', params=params)
+        def load():
+            context = self.call_linotp('/userservice/pre_context',
+                                       params=params, coalesce=True)
+            # keep the realm list parsed along with the context
+            realms = []
+            if context and context.get('realm_box'):
+                realms = list(json.loads(context['realms']).keys())
+            return context, realms
+
+        if params:
+            context, self.realms = load()
+            return context
+
+        # the pre context is global and only depends on the language
+        context, self.realms = preauth_cache.get_or_load(
+                                        self.language, load,
+                                        refresh_ahead=DEFAULT_REFRESH_AHEAD,
+                                        unavailable=linotp_unavailable)
+        if not context:
+            # do not keep a failed lookup
+            preauth_cache.invalidate(self.language)
         return context
 
 
@@ -244,38 +359,75 @@ class BaseController(WSGIController):
         """
         if params is None:
             params = {}
-        context = self.call_linotp('/userservice/context', params=params)
+
+        def load():
+            return self.call_linotp('/userservice/context', params=params,
+                                    coalesce=True)
+
+        if params.keys() != ['user'] or not context_cache.ttl:
+            return load()
+
+        key = self._context_key(params['user'])
+        context = context_cache.get_or_load(key, load,
+                                            unavailable=linotp_unavailable)
+        if not context:
+            context_cache.invalidate(key)
         return context
 
+    def _context_key(self, user):
+        """
+        the key of the cached context of the user in the current session
+        and language - the history pages of the user are cached under this
+        key as well
+        """
+        scope = (user, getattr(self, 'auth_cookie', None))
+        generation = context_cache.get(('generation',) + scope)
+        if generation is None:
+            generation = new_generation()
+            # the generation has to outlive the entries it belongs to
+            ttl = max(context_cache.ttl or 0, history_cache.ttl or 0)
+            context_cache.set(('generation',) + scope, generation,
+                              ttl=ttl * 2)
+        return scope + (self.language, generation)
+
+    def invalidate_context(self, user):
+        """
+        drop the cached contexts and history pages of the user in the current
+        session - for all languages
+        """
+        scope = (user, getattr(self, 'auth_cookie', None))
+        context_cache.invalidate(('generation',) + scope)
+
+    def forget_session(self):
+        """
+        drop the cached data of the expired upstream session
+        """
+        try:
+            identity = request.environ.get('repoze.who.identity') or {}
+            userid = identity.get('repoze.who.userid')
+        except TypeError:
+            # a cache entry is reloaded in the background without request -
+            # the user is the one of the request, which started the reload
+            userid = getattr(self, 'userid', None)
+            if userid and getattr(self, 'auth_cookie', None):
+                userid = '%s;%s' % (userid, self.auth_cookie)
+        if not userid:
+            return
+        userinfo_cache.invalidate(userid)
+        self.invalidate_context(userid.split(';', 1)[0])
+
 
     def set_language(self, headers):
         '''Invoke before everything else. And set the translation language'''
         languages = headers.get('Accept-Language', '')
 
-        found_lang = False
-
-        for match in accept_language_regexp.finditer(languages):
-            # make sure we have a correct language code format
-            language = match.group(1)
-            if not language:
-                continue
-            language = language.replace('_', '-').lower()
-
-            # en is the default language
-            if language.split('-')[0] == 'en':
-                found_lang = True
-                break
-
-            try:
-                set_lang(language.split('-')[0])
-                found_lang = True
-                break
-            except LanguageError:
-                log.debug("Cannot set requested language: %s. Trying next language if available.",
-                          language)
-
-        if not found_lang:
-            log.warning("Cannot set preferred language: %r" % languages)
+        translators = app_config['pylons.app_globals'].translators
+        language = negotiate_language(languages, translators)
+
+        # the language of the response - en is the default language
+        self.language = language or DEFAULT_LANGUAGE
+        if language and language != DEFAULT_LANGUAGE:
+            install_translator(translators[language])
 
         return
 
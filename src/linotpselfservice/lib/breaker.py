@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+
+"""
+circuit breaker for the requests to the LinOTP servers
+"""
+
+import logging
+import threading
+import time
+
+import requests
+
+LOG = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_LATENCY_THRESHOLD = 10.0
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_HALF_OPEN_CALLS = 1
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Exception raised, when a request is refused as the circuit is open.
+
+    It is a ConnectionError, so it is handled like an unreachable LinOTP
+    server - without waiting for the connection to fail.
+    """
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Stops sending requests to LinOTP after a series of failed or too slow
+    requests.
+
+    closed:    all requests pass, failures are counted
+    open:      all requests fail immediately with CircuitOpenError
+    half_open: after the reset_timeout a limited number of probe requests
+               pass - the circuit closes on success and opens again on
+               failure
+    """
+    def __init__(self, name='linotp',
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 latency_threshold=DEFAULT_LATENCY_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 half_open_calls=DEFAULT_HALF_OPEN_CALLS):
+        """
+        Creates a CircuitBreaker object.
+
+        :param name: name of the protected service, used for monitoring
+        :param failure_threshold: number of consecutive failures, which open
+                                  the circuit - 0 disables the breaker
+        :param latency_threshold: seconds after which a successful request
+                                  is counted as failure, 0 to disable
+        :param reset_timeout: seconds the circuit stays open
+        :param half_open_calls: number of concurrent probe requests
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probes = 0
+
+        # counters for monitoring
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self):
+        """
+        check if a request may pass
+
+        :raises CircuitOpenError: if the circuit is open
+        """
+        if not self.failure_threshold:
+            return
+
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError("circuit to %s is open" % self.name)
+                LOG.info("circuit to %s is half open", self.name)
+                self.state = HALF_OPEN
+                self._probes = 0
+
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError("circuit to %s is half open"
+                                           % self.name)
+                self._probes += 1
+
+    def record_success(self, latency=None):
+        """
+        register a completed request - a too slow one counts as failure
+        """
+        if (latency is not None and self.latency_threshold and
+                latency > self.latency_threshold):
+            LOG.warning("request to %s took %.2fs", self.name, latency)
+            self.record_failure()
+            return
+
+        with self._lock:
+            if self.state != CLOSED:
+                LOG.info("circuit to %s is closed again", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                    self.state == CLOSED and self.failure_threshold and
+                    self.failures >= self.failure_threshold):
+                LOG.error("circuit to %s is open after %d failure(s)",
+                          self.name, self.failures)
+                self.state = OPEN
+                self.opened_at = time.time()
+                self.trips += 1
+
+    def status(self):
+        """
+        :return: dict with the state of the breaker for monitoring
+        """
+        with self._lock:
+            return {'name': self.name,
+                    'state': self.state,
+                    'failures': self.failures,
+                    'opened_at': self.opened_at,
+                    'trips': self.trips,
+                    'rejected': self.rejected,
+                    }
@@ -0,0 +1,828 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+
+"""
+cache regions for the data retrieved from LinOTP
+
+Every region is kept in process by default, in a least recently used
+cache with a maximum number of entries. A region listed in the
+'beaker.cache.regions' setting can be moved into any other backend of
+the beaker CacheManager of the app_globals - file, dbm or ext:memcached:
+
+    beaker.cache.regions = context, userinfo
+    beaker.cache.context.type = ext:memcached
+    beaker.cache.context.url = 127.0.0.1:11211
+    beaker.cache.context.expire = 30
+    beaker.cache.userinfo.max_size = 5000
+
+The 'expire' of a region is the time to live of its entries in seconds,
+0 disables the region. The 'max_size' limits the in-process and the sqlite
+regions. An in-process region with 'compact = true' keeps its entries as
+compressed pickles and 'max_bytes' limits the bytes of its entries.
+Within 'stale_while_revalidate' seconds after its expiry, an entry is
+served while it is reloaded in the background, and within 'stale_if_error'
+seconds, when reloading it from LinOTP fails because LinOTP is not
+available - any other failure, like an expired session, is raised.
+
+The type 'sqlite' keeps a region in a local SQLite database in WAL mode,
+which is shared by all worker processes of the host:
+
+    beaker.cache.regions = pre_context
+    beaker.cache.pre_context.type = sqlite
+    beaker.cache.pre_context.path = %(here)s/data/cache/regions.sqlite
+"""
+
+import hashlib
+import itertools
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from collections import OrderedDict
+
+import requests
+
+from paste.deploy.converters import asbool
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 1000
+
+# fraction of the time to live, after which an entry is refreshed in the
+# background while the cached value is still served
+DEFAULT_REFRESH_AHEAD = 0.8
+
+# the beaker cache type, which is served by the in-process TTLCache
+MEMORY = 'memory'
+
+# the cache type of the SQLiteCache shared between processes
+SQLITE = 'sqlite'
+
+# the database of the sqlite regions in the beaker cache data_dir
+SQLITE_FILE = 'regions.sqlite'
+
+# seconds a writer waits for the database lock of another process
+SQLITE_BUSY_TIMEOUT = 5.0
+
+# entries of at least this size (bytes) are stored compressed
+COMPRESS_MIN_SIZE = 256
+
+# estimated bytes of an in-process entry besides its value: the key, the
+# entry tuple and the link of the ordered dict
+ENTRY_OVERHEAD = 500
+
+# number of writes after which the expired and the oldest entries above the
+# maximum size are removed
+SQLITE_PRUNE_INTERVAL = 100
+
+
+def encode_value(value):
+    """
+    serialize a cache value into a compact byte string - a pickle, which is
+    compressed from COMPRESS_MIN_SIZE on
+
+    :return: the byte string
+    """
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if len(data) >= COMPRESS_MIN_SIZE:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return 'z' + compressed
+    return 'p' + data
+
+
+def decode_value(data):
+    """
+    :param data: the byte string of encode_value
+    :return: a new copy of the value
+    """
+    if data[:1] == 'z':
+        return pickle.loads(zlib.decompress(data[1:]))
+    return pickle.loads(data[1:])
+
+
+class Cache(object):
+    """
+    Base of the cache backends: the time to live and refresh handling and
+    the hit, miss and eviction counters. The backends store the entries as
+    tuple of (value, stored, expires).
+
+    Expired entries are kept for the stale windows: within the
+    stale_while_revalidate window an expired entry is served, while it is
+    reloaded in the background, and within the stale_if_error window it is
+    served, when the reload fails.
+
+    Cached values are shared between threads and must be treated as read
+    only.
+    """
+    backend = None
+
+    def __init__(self, name, ttl=None, stale_while_revalidate=0,
+                 stale_if_error=0):
+        """
+        :param name: name of the cache for logging and the metrics
+        :param ttl: default time to live of the entries in seconds
+        :param stale_while_revalidate: seconds an expired entry is served
+                                       while it is reloaded
+        :param stale_if_error: seconds an expired entry is served, when it
+                               could not be reloaded
+        """
+        self.name = name
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate or 0
+        self.stale_if_error = stale_if_error or 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @property
+    def grace(self):
+        """
+        seconds the backend keeps an entry after its expiry
+        """
+        return max(self.stale_while_revalidate, self.stale_if_error)
+
+    # the backend interface
+
+    def _get_entry(self, key):
+        raise NotImplementedError()
+
+    def _set_entry(self, key, entry, ttl):
+        raise NotImplementedError()
+
+    def invalidate(self, key):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def size(self):
+        """
+        :return: the number of entries or None, if the backend can not tell
+        """
+        return None
+
+    def size_bytes(self):
+        """
+        :return: the bytes of the entries or None, if they are not counted
+        """
+        return None
+
+    def _lookup(self, key, now):
+        """
+        :return: tuple of (value, age, overdue) or None - overdue are the
+                 seconds since the expiry, negative for a fresh entry
+        """
+        entry = self._get_entry(key)
+        if entry is None:
+            return None
+        value, stored, expires = entry
+        if now >= expires + self.grace:
+            return None
+        return value, now - stored, now - expires
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key, default=None):
+        """
+        :return: the value of the fresh entry or the default
+        """
+        found = self._lookup(key, time.time())
+        if found is None or found[2] >= 0:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return found[0]
+
+    def set(self, key, value, ttl=None):
+        """
+        store the value for ttl seconds - a ttl of 0 does not store it
+
+        :param ttl: time to live, defaults to the ttl of the cache
+        """
+        if ttl is None:
+            ttl = self.ttl
+        if not ttl or ttl <= 0:
+            return
+        now = time.time()
+        self._set_entry(key, (value, now, now + ttl), ttl)
+
+    def get_or_load(self, key, loader, ttl=None, refresh_ahead=None,
+                    unavailable=None):
+        """
+        get the cached value or load and cache it - an expired entry is
+        served within the stale windows
+
+        :param key: key of the entry
+        :param loader: function without arguments, which returns the value
+        :param ttl: time to live of the entry in seconds, 0 for no caching,
+                    defaults to the ttl of the cache
+        :param refresh_ahead: fraction of the ttl after which the entry is
+                              reloaded in a background thread, while the
+                              cached value is still returned
+        :param unavailable: function, which tells by the exception of the
+                            loader, that the source is not available - only
+                            then a stale entry is served or kept. Defaults
+                            to transport_error
+        :return: the value
+        """
+        if unavailable is None:
+            unavailable = transport_error
+        if ttl is None:
+            ttl = self.ttl
+        if not ttl or ttl <= 0:
+            return loader()
+
+        found = self._lookup(key, time.time())
+        if found is not None:
+            value, age, overdue = found
+            if overdue < 0:
+                self._count('hits')
+                if refresh_ahead and age >= ttl * refresh_ahead:
+                    self._refresh(key, loader, ttl, unavailable)
+                return value
+
+            if overdue < self.stale_while_revalidate:
+                self._count('stale')
+                LOG.warning("serving stale %s entry %.1fs after its expiry "
+                            "while it is reloaded", self.name, overdue)
+                self._refresh(key, loader, ttl, unavailable)
+                return value
+
+        self._count('misses')
+        try:
+            value = loader()
+        except Exception as exx:
+            if (found is None or found[2] >= self.stale_if_error or
+                    not unavailable(exx)):
+                raise
+            self._count('stale')
+            LOG.warning("serving stale %s entry %.1fs after its expiry, as "
+                        "reloading failed: %r", self.name, found[2], exx)
+            return found[0]
+
+        self.set(key, value, ttl)
+        return value
+
+    def _refresh(self, key, loader, ttl, unavailable):
+        """
+        reload the entry in a background thread - one at a time per key.
+        If the source is not available, the entry is kept, any other
+        failure drops it, so that the next request loads it and gets the
+        error.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, loader(), ttl)
+            except Exception as exx:
+                LOG.warning("background refresh of %s failed: %r",
+                            self.name, exx)
+                if not unavailable(exx):
+                    self.invalidate(key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        thread = threading.Thread(target=refresh,
+                                  name='refresh-%s' % self.name)
+        thread.daemon = True
+        thread.start()
+
+    def stats(self):
+        """
+        :return: dict with the counters of the cache
+        """
+        with self._lock:
+            return {'backend': self.backend,
+                    'ttl': self.ttl,
+                    'size': self.size(),
+                    'bytes': self.size_bytes(),
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'stale': self.stale,
+                    'evictions': self.evictions,
+                    }
+
+
+def transport_error(exx):
+    """
+    :return: True, if the exception tells, that the server could not be
+             reached - including an open circuit breaker
+    """
+    return isinstance(exx, requests.RequestException)
+
+
+class TTLCache(Cache):
+    """
+    Thread-safe in-process cache with a time to live per entry and a least
+    recently used eviction, when the maximum number of entries or bytes is
+    reached.
+
+    A compact cache keeps the values as compressed pickles - the per-user
+    entries are dicts of the same keys and lists, which take several times
+    the memory of their encoding. Every lookup returns a new copy then.
+    """
+    backend = MEMORY
+
+    def __init__(self, name, max_size=DEFAULT_MAX_SIZE, ttl=None,
+                 compact=False, max_bytes=None, stale_while_revalidate=0,
+                 stale_if_error=0):
+        """
+        Creates a TTLCache object.
+
+        :param name: name of the cache for logging
+        :param max_size: maximum number of entries
+        :param ttl: default time to live of the entries in seconds
+        :param compact: store the values encoded by encode_value
+        :param max_bytes: maximum bytes of the entries - the size of a
+                          value, which is not compact, is estimated by its
+                          pickle
+        :param stale_while_revalidate: see Cache
+        :param stale_if_error: see Cache
+        """
+        super(TTLCache, self).__init__(
+                            name, ttl=ttl,
+                            stale_while_revalidate=stale_while_revalidate,
+                            stale_if_error=stale_if_error)
+        self.max_size = max_size
+        self.compact = compact
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def _get_entry(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            if time.time() >= entry[2] + self.grace:
+                self._bytes -= entry[3]
+                return None
+            # keep the order of the least recently used entries
+            self._entries[key] = entry
+
+        value, stored, expires, _size = entry
+        if self.compact:
+            value = decode_value(value)
+        return value, stored, expires
+
+    def _set_entry(self, key, entry, ttl):
+        value, stored, expires = entry
+        size = 0
+        if self.compact:
+            value = encode_value(value)
+            size = len(value) + ENTRY_OVERHEAD
+        elif self.max_bytes:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) + \
+                                                            ENTRY_OVERHEAD
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, stored, expires, size)
+            self._bytes += size
+            while (len(self._entries) > self.max_size or
+                   (self.max_bytes and self._bytes > self.max_bytes and
+                    len(self._entries) > 1)):
+                _key, old = self._entries.popitem(last=False)
+                self._bytes -= old[3]
+                self.evictions += 1
+
+    def _remove(self, key):
+        """
+        remove the entry - must be called locked
+        """
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[3]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self):
+        return len(self._entries)
+
+    def size_bytes(self):
+        if not self.compact and not self.max_bytes:
+            return None
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class BeakerCache(Cache):
+    """
+    Cache on top of a beaker cache namespace - the file, dbm and memcached
+    backends of the beaker CacheManager. The keys are hashed, as these
+    backends only take short strings, and the values are pickled by the
+    backend. Evictions are done by the backend and are not counted.
+    """
+    def __init__(self, name, beaker_cache, ttl=None, backend=None,
+                 stale_while_revalidate=0, stale_if_error=0):
+        """
+        :param name: name of the cache for logging
+        :param beaker_cache: the beaker.cache.Cache object
+        :param ttl: default time to live of the entries in seconds
+        :param backend: the beaker cache type for the metrics
+        :param stale_while_revalidate: see Cache
+        :param stale_if_error: see Cache
+        """
+        super(BeakerCache, self).__init__(
+                            name, ttl=ttl,
+                            stale_while_revalidate=stale_while_revalidate,
+                            stale_if_error=stale_if_error)
+        self.cache = beaker_cache
+        self.backend = backend
+
+    @staticmethod
+    def _key(key):
+        return hashlib.sha1(pickle.dumps(key, 2)).hexdigest()
+
+    def _get_entry(self, key):
+        try:
+            return self.cache.get(self._key(key))
+        except KeyError:
+            return None
+        except Exception as exx:
+            LOG.warning("lookup in cache %s failed: %r", self.name, exx)
+            return None
+
+    def _set_entry(self, key, entry, ttl):
+        try:
+            self.cache.put(self._key(key), entry,
+                           expiretime=int(math.ceil(ttl + self.grace)))
+        except Exception as exx:
+            LOG.warning("storing in cache %s failed: %r", self.name, exx)
+
+    def invalidate(self, key):
+        try:
+            self.cache.remove_value(self._key(key))
+        except Exception as exx:
+            LOG.warning("removing from cache %s failed: %r", self.name, exx)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class SQLiteCache(Cache):
+    """
+    Cache in a local SQLite database, which is shared by the processes on
+    the host. The database runs in WAL mode, so readers do not block each
+    other nor the single writer. Every thread of every process has its own
+    connection - connections must not be shared across a fork.
+
+    The entries expire by their time to live. When the region has grown
+    above the maximum size, the entries stored first are evicted.
+    """
+    backend = SQLITE
+
+    def __init__(self, name, path, max_size=DEFAULT_MAX_SIZE, ttl=None,
+                 stale_while_revalidate=0, stale_if_error=0):
+        """
+        :param name: name of the region - all regions share the database
+        :param path: file name of the database
+        :param max_size: maximum number of entries of the region
+        :param ttl: default time to live of the entries in seconds
+        :param stale_while_revalidate: see Cache
+        :param stale_if_error: see Cache
+        """
+        super(SQLiteCache, self).__init__(
+                            name, ttl=ttl,
+                            stale_while_revalidate=stale_while_revalidate,
+                            stale_if_error=stale_if_error)
+        self.path = path
+        self.max_size = max_size
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                     " region TEXT NOT NULL,"
+                     " key TEXT NOT NULL,"
+                     " value BLOB NOT NULL,"
+                     " stored REAL NOT NULL,"
+                     " expires REAL NOT NULL,"
+                     " PRIMARY KEY (region, key)) WITHOUT ROWID")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_stored"
+                     " ON cache (region, stored)")
+
+    def _connection(self):
+        """
+        :return: the connection of the current thread and process
+        """
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            local.conn = conn
+            local.pid = os.getpid()
+        return local.conn
+
+    @staticmethod
+    def _key(key):
+        return hashlib.sha1(pickle.dumps(key, 2)).hexdigest()
+
+    def _get_entry(self, key):
+        try:
+            row = self._connection().execute(
+                        "SELECT value, stored, expires FROM cache"
+                        " WHERE region = ? AND key = ?",
+                        (self.name, self._key(key))).fetchone()
+        except sqlite3.Error as exx:
+            LOG.warning("lookup in cache %s failed: %r", self.name, exx)
+            return None
+        if row is None:
+            return None
+        value, stored, expires = row
+        return decode_value(str(value)), stored, expires
+
+    def _set_entry(self, key, entry, ttl):
+        value, stored, expires = entry
+        data = sqlite3.Binary(encode_value(value))
+        try:
+            self._connection().execute(
+                        "INSERT OR REPLACE INTO cache"
+                        " (region, key, value, stored, expires)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (self.name, self._key(key), data, stored, expires))
+        except sqlite3.Error as exx:
+            LOG.warning("storing in cache %s failed: %r", self.name, exx)
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % SQLITE_PRUNE_INTERVAL == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """
+        remove the expired entries and the oldest ones above the maximum
+        size of the region
+        """
+        try:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache WHERE region = ? AND expires <= ?",
+                         (self.name, time.time() - self.grace))
+            cursor = conn.execute(
+                        "DELETE FROM cache WHERE region = ? AND key IN ("
+                        " SELECT key FROM cache WHERE region = ?"
+                        " ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+                        (self.name, self.name, self.max_size))
+        except sqlite3.Error as exx:
+            LOG.warning("pruning cache %s failed: %r", self.name, exx)
+            return
+        if cursor.rowcount > 0:
+            with self._lock:
+                self.evictions += cursor.rowcount
+
+    def invalidate(self, key):
+        try:
+            self._connection().execute(
+                        "DELETE FROM cache WHERE region = ? AND key = ?",
+                        (self.name, self._key(key)))
+        except sqlite3.Error as exx:
+            LOG.warning("removing from cache %s failed: %r", self.name, exx)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache WHERE region = ?",
+                                   (self.name,))
+
+    def size(self):
+        try:
+            return self._connection().execute(
+                        "SELECT COUNT(*) FROM cache WHERE region = ?"
+                        " AND expires > ?", (self.name,
+                                             time.time() - self.grace)
+                        ).fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    def size_bytes(self):
+        try:
+            return self._connection().execute(
+                        "SELECT SUM(LENGTH(value)) FROM cache"
+                        " WHERE region = ?", (self.name,)
+                        ).fetchone()[0] or 0
+        except sqlite3.Error:
+            return None
+
+
+class CacheRegion(object):
+    """
+    A named cache region: it forwards to its backend cache, which is
+    replaced by the configuration of the application. Until then, the
+    region is kept in process with its defaults.
+    """
+    def __init__(self, name, ttl, max_size=DEFAULT_MAX_SIZE, compact=False,
+                 max_bytes=None, stale_while_revalidate=0, stale_if_error=0):
+        """
+        :param name: name of the region in the beaker cache settings
+        :param ttl: default time to live of the entries in seconds
+        :param max_size: default maximum number of entries
+        :param compact: default of the compact storage in process
+        :param max_bytes: default maximum bytes of the entries in process
+        :param stale_while_revalidate: default seconds an expired entry is
+                                       served while it is reloaded
+        :param stale_if_error: default seconds an expired entry is served,
+                               when LinOTP fails
+        """
+        self.name = name
+        self.default_ttl = ttl
+        self.default_max_size = max_size
+        self.default_compact = compact
+        self.default_max_bytes = max_bytes
+        self.default_stale = (stale_while_revalidate, stale_if_error)
+        self.backend = TTLCache(name, max_size=max_size, ttl=ttl,
+                                compact=compact, max_bytes=max_bytes,
+                                stale_while_revalidate=stale_while_revalidate,
+                                stale_if_error=stale_if_error)
+        regions[name] = self
+
+    @property
+    def ttl(self):
+        return self.backend.ttl
+
+    def configure(self, cache_manager, options):
+        """
+        set up the backend of the region
+
+        :param cache_manager: the beaker CacheManager of the app_globals
+        :param options: the parsed beaker options of the region or None
+        """
+        options = dict(options or {})
+        ttl = options.pop('expire', None)
+        if ttl is None:
+            ttl = self.default_ttl
+        max_size = int(options.pop('max_size', self.default_max_size))
+        compact = asbool(options.pop('compact', self.default_compact))
+        max_bytes = options.pop('max_bytes', self.default_max_bytes)
+        if max_bytes is not None:
+            max_bytes = int(max_bytes)
+        stale = {
+            'stale_while_revalidate': int(options.pop(
+                        'stale_while_revalidate', self.default_stale[0])),
+            'stale_if_error': int(options.pop(
+                        'stale_if_error', self.default_stale[1])),
+            }
+        cache_type = options.get('type') or MEMORY
+
+        if cache_type == MEMORY:
+            self.backend = TTLCache(self.name, max_size=max_size, ttl=ttl,
+                                    compact=compact, max_bytes=max_bytes,
+                                    **stale)
+        elif cache_type == SQLITE:
+            path = options.get('path') or os.path.join(
+                                    options.get('data_dir') or '', SQLITE_FILE)
+            self.backend = SQLiteCache(self.name, path, max_size=max_size,
+                                       ttl=ttl, **stale)
+        else:
+            options.pop('enabled', None)
+            beaker_cache = cache_manager.get_cache(self.name, **options)
+            self.backend = BeakerCache(self.name, beaker_cache, ttl=ttl,
+                                       backend=cache_type, **stale)
+        LOG.debug("cache region %s: %s, ttl %r", self.name, cache_type, ttl)
+
+    def get(self, key, default=None):
+        return self.backend.get(key, default)
+
+    def set(self, key, value, ttl=None):
+        return self.backend.set(key, value, ttl=ttl)
+
+    def get_or_load(self, key, loader, ttl=None, refresh_ahead=None,
+                    unavailable=None):
+        return self.backend.get_or_load(key, loader, ttl=ttl,
+                                        refresh_ahead=refresh_ahead,
+                                        unavailable=unavailable)
+
+    def invalidate(self, key):
+        return self.backend.invalidate(key)
+
+    def clear(self):
+        return self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+
+# the cache regions by name
+regions = {}
+
+
+def configure_regions(cache_manager):
+    """
+    set up the backends of all cache regions from the beaker cache regions
+    of the CacheManager
+
+    :param cache_manager: the beaker CacheManager of the app_globals
+    """
+    for name, region in regions.items():
+        region.configure(cache_manager, cache_manager.regions.get(name))
+
+
+def region_stats():
+    """
+    :return: dict with the metrics per cache region
+    """
+    return dict((name, region.stats()) for name, region in regions.items())
+
+
+# the pre authentication context per browser language
+preauth_cache = CacheRegion('pre_context', ttl=300, max_size=100,
+                            stale_while_revalidate=300, stale_if_error=3600)
+
+# the user info per repoze.who.userid - the login and the upstream session
+userinfo_cache = CacheRegion('userinfo', ttl=300, max_size=100000,
+                             compact=True, max_bytes=32 * 1024 * 1024)
+
+# the load_form html fragments with their etag per user policy scope, form
+# type and language
+form_cache = CacheRegion('forms', ttl=300, max_size=10000)
+
+# the rendered static selfservice forms with their etag per template,
+# language and the context values they depend on
+render_cache = CacheRegion('templates', ttl=3600, max_size=1000)
+
+# the selfservice context per user, upstream session and language - along
+# with the generation tokens per user and upstream session, which are part
+# of the key: replacing the token invalidates the cached contexts of all
+# languages and the history pages at once
+context_cache = CacheRegion('context', ttl=30, max_size=100000,
+                            compact=True, max_bytes=64 * 1024 * 1024,
+                            stale_while_revalidate=30, stale_if_error=300)
+
+# the rendered error documents for LinOTP outages per language, error code
+# and kind of failure
+error_cache = CacheRegion('error_pages', ttl=300, max_size=100)
+
+# the history pages per user, upstream session and query - disabled by
+# default, so the history is streamed
+history_cache = CacheRegion('history', ttl=0, max_size=1000)
+
+# the negotiated language per Accept-Language header - the translations
+# only change with a restart
+language_cache = CacheRegion('languages', ttl=86400, max_size=1000)
+
+_generations = itertools.count()
+
+
+def new_generation():
+    """
+    :return: a token, which differs from all former ones
+    """
+    return '%x.%x.%d' % (os.getpid(), int(time.time()), next(_generations))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+paster commands of the selfservice
+"""
+
+import os
+
+from paste.script.command import Command
+
+from linotpselfservice.lib.templates import PRECOMPILED_DIRECTORY
+from linotpselfservice.lib.templates import precompile_templates
+
+
+class PrecompileTemplatesCommand(Command):
+    """
+    Compile the Mako templates of the selfservice into modules
+
+    The modules are written to the templates_compiled directory of the
+    package or the given directory, from where they are loaded with the
+    templates.read_only setting.
+    """
+    summary = __doc__.strip().splitlines()[0]
+    usage = '[module directory]'
+    group_name = 'linotpselfservice'
+    min_args = 0
+    max_args = 1
+    parser = Command.standard_parser(verbose=True)
+
+    def command(self):
+        module_directory = PRECOMPILED_DIRECTORY
+        if self.args:
+            module_directory = os.path.abspath(self.args[0])
+
+        uris = precompile_templates(module_directory)
+        if self.verbose:
+            for uri in uris:
+                print uri
+        print "compiled %d templates into %s" % (len(uris), module_directory)
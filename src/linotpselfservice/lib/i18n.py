@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the translations of the selfservice
+
+The gettext catalogs of all languages are loaded once, when the
+application is started, and the language negotiated for an
+Accept-Language header is kept in the 'languages' cache region - so a
+request only looks up its header and installs the preloaded translator.
+
+The catalogs are compiled by 'make compile_catalog'. A catalog, which has
+not been compiled or is older than its .po file, is compiled in memory at
+startup, if babel is installed.
+"""
+
+import os
+import logging
+
+from StringIO import StringIO
+from gettext import GNUTranslations
+
+import pylons
+
+from linotpselfservice.lib.cache import language_cache
+
+try:
+    from babel.messages.pofile import read_po
+    from babel.messages.mofile import write_mo
+except ImportError:
+    read_po = None
+    write_mo = None
+
+log = logging.getLogger(__name__)
+
+# the language of the templates, which needs no translator
+DEFAULT_LANGUAGE = 'en'
+
+# longest Accept-Language header, which is evaluated - the header is set
+# by the client, browsers send less than a hundred characters
+MAX_ACCEPT_LANGUAGE = 1024
+
+# longest primary language subtag - RFC 5646 allows 8 letters
+MAX_LANGUAGE_LENGTH = 8
+
+
+def _compile_catalog(po_file, locale):
+    """
+    compile a .po file in memory
+
+    :return: the GNUTranslations or None, if babel is not available
+    """
+    if read_po is None:
+        return None
+    with open(po_file, 'rb') as po:
+        catalog = read_po(po, locale=locale)
+    mo = StringIO()
+    write_mo(mo, catalog)
+    mo.seek(0)
+    return GNUTranslations(mo)
+
+
+def load_translators(localedir, domain):
+    """
+    load the translators of all languages in the locale directory
+
+    :param localedir: the i18n directory with <lang>/LC_MESSAGES/<domain>.po
+    :param domain: the gettext domain - the package name
+    :return: dict of language code and translator
+    """
+    translators = {}
+    if not os.path.isdir(localedir):
+        return translators
+
+    for language in sorted(os.listdir(localedir)):
+        messages = os.path.join(localedir, language, 'LC_MESSAGES')
+        po_file = os.path.join(messages, domain + '.po')
+        mo_file = os.path.join(messages, domain + '.mo')
+
+        translator = None
+        if os.path.exists(mo_file) and (
+                not os.path.exists(po_file) or
+                os.path.getmtime(mo_file) >= os.path.getmtime(po_file)):
+            with open(mo_file, 'rb') as mo:
+                translator = GNUTranslations(mo)
+        elif os.path.exists(po_file):
+            translator = _compile_catalog(po_file, language)
+
+        if translator is None:
+            log.warning("no compiled catalog for language %s - run "
+                        "'make compile_catalog' or install babel", language)
+            continue
+
+        # the language as returned by pylons' get_lang
+        translator.pylons_lang = [language]
+        translators[language.lower()] = translator
+
+    log.info("loaded translations: %s", ', '.join(sorted(translators)))
+    return translators
+
+
+def _cap(accept_language):
+    """
+    cut an overlong header before its last complete language range
+    """
+    if len(accept_language) <= MAX_ACCEPT_LANGUAGE:
+        return accept_language
+    return accept_language[:MAX_ACCEPT_LANGUAGE].rsplit(',', 1)[0]
+
+
+def parse_accept_language(accept_language):
+    """
+    parse the Accept-Language header, which is in the form of i.e.
+
+        de-DE, de; q=0.7, en; q=0.3
+
+    The header is only split at the separators, so the time is linear in
+    its length, which is capped at MAX_ACCEPT_LANGUAGE.
+
+    :param accept_language: the raw Accept-Language header
+    :return: the primary language subtags ordered by their quality - the
+             ranges of the same quality in the order of the header, those
+             with a quality of 0, the wildcard and malformed ranges left out
+    """
+    ranges = []
+    for position, item in enumerate(_cap(accept_language).split(',')):
+        parts = item.split(';')
+
+        # make sure we have a correct language code format
+        language = parts[0].strip().replace('_', '-').split('-')[0].lower()
+        if (not language or len(language) > MAX_LANGUAGE_LENGTH or
+                not language.isalpha()):
+            continue
+
+        quality = 1.0
+        for param in parts[1:]:
+            name, _sep, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+                break
+
+        # rules out the 'not acceptable' ranges and nan
+        if not 0.0 < quality <= 1.0:
+            continue
+
+        ranges.append((-quality, position, language))
+
+    ranges.sort()
+    return [language for _quality, _position, language in ranges]
+
+
+def negotiate_language(accept_language, languages):
+    """
+    get the preferred language of the Accept-Language header, for which
+    there is a translation - the result is cached per header
+
+    :param accept_language: the raw Accept-Language header
+    :param languages: the available languages
+    :return: the language code, DEFAULT_LANGUAGE or None, if none matches
+    """
+    accept_language = _cap(accept_language)
+    language = language_cache.get(accept_language)
+    if language is None:
+        language = _negotiate(accept_language, languages)
+        language_cache.set(accept_language, language)
+    return language or None
+
+
+def _negotiate(accept_language, languages):
+    """
+    :return: the language code or '' if no language is available
+    """
+    for language in parse_accept_language(accept_language):
+        if language == DEFAULT_LANGUAGE or language in languages:
+            return language
+
+        log.debug("Cannot set requested language: %s. Trying next language "
+                  "if available.", language)
+
+    log.warning("Cannot set preferred language: %r", accept_language)
+    return ''
+
+
+def install_translator(translator):
+    """
+    use the preloaded translator for the current request - as pylons'
+    set_lang does with a newly loaded one
+    """
+    environ = pylons.request.environ
+    environ['pylons.pylons'].translator = translator
+    if 'paste.registry' in environ:
+        environ['paste.registry'].replace(pylons.translator, translator)
@@ -31,46 +31,821 @@ different requests versions.
 
 import requests
 import logging
+import os
+import random
+import re
+import threading
+import time
+from urllib import urlencode, unquote_plus
 from urlparse import urlparse
 
+from cookielib import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+
+from linotpselfservice.lib.breaker import CircuitBreaker
+
 LOG = logging.getLogger(__name__)
 
-class Connection(object):
+DEFAULT_POOL_SIZE = 10
+DEFAULT_IDLE_TIMEOUT = 300
+
+DEFAULT_CONNECT_TIMEOUT = 3.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_DEADLINE = 60.0
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.1
+
+# only the read endpoints may be repeated without side effects
+IDEMPOTENT_PATHS = frozenset([
+    '/userservice/context',
+    '/userservice/pre_context',
+    '/userservice/userinfo',
+    '/userservice/history',
+    ])
+
+# gateway errors, which indicate the request did not reach LinOTP
+RETRY_STATUS_CODES = frozenset([502, 503, 504])
+
+LEAST_OUTSTANDING = 'least_outstanding'
+EWMA = 'ewma'
+
+DEFAULT_HEALTH_CHECK_INTERVAL = 10.0
+DEFAULT_HEALTH_CHECK_PATH = '/'
+DEFAULT_HEALTH_CHECK_TIMEOUT = 2.0
+
+# size of the chunks, in which streamed responses are proxied
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# weight of the latest latency sample in the moving average
+EWMA_DECAY = 0.3
+
+# responses expected to be smaller are requested without compression
+DEFAULT_COMPRESSION_THRESHOLD = 1024
+ACCEPT_COMPRESSED = 'gzip, deflate'
+
+
+def split_urls(linotp_url):
+    """
+    split the linotp_url setting, which might contain a comma or white
+    space separated list of LinOTP servers, and trim the trailing slashes
+
+    :return: list of urls
+    """
+    return [url.rstrip('/') for url in re.split(r'[,\s]+', linotp_url or '')
+            if url.rstrip('/')]
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
     """
-    Represents a HTTP connection that can send requests repeatedly. It is
-    basically a wrapper for a requests.Session object.
+    Exception raised, when the deadline of a request is used up before the
+    request could be sent
+    """
+    pass
+
+
+def _as_float(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+class RequestPolicy(object):
+    """
+    Timeouts, deadline and retry budget for the requests to LinOTP
+    """
+    def __init__(
+            self,
+            connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+            read_timeout=DEFAULT_READ_TIMEOUT,
+            endpoint_timeouts=None,
+            deadline=DEFAULT_DEADLINE,
+            retries=DEFAULT_RETRIES,
+            retry_backoff=DEFAULT_RETRY_BACKOFF,
+            idempotent_paths=IDEMPOTENT_PATHS
+            ):
+        """
+        Creates a RequestPolicy object.
+
+        :param connect_timeout: seconds to wait for the connection
+        :param read_timeout: seconds to wait for the response
+        :param endpoint_timeouts: dict of path: (connect, read) timeouts,
+                                  which overrule the defaults
+        :param deadline: overall seconds for a request including all retries,
+                         0 or None for no deadline
+        :param retries: number of retries for idempotent requests
+        :param retry_backoff: base delay in seconds between the retries
+        :param idempotent_paths: paths which might be retried
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.endpoint_timeouts = dict(endpoint_timeouts or {})
+        self.deadline = deadline or None
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.idempotent_paths = idempotent_paths
+
+    @classmethod
+    def from_config(cls, config, prefix=''):
+        """
+        create the policy from the ini settings:
+
+            <prefix>connect_timeout = 3
+            <prefix>read_timeout = 30
+            <prefix>deadline = 60
+            <prefix>retries = 2
+            <prefix>retry_backoff = 0.1
+            <prefix>timeout.<endpoint> = <connect>, <read>
+
+        where endpoint is the last part of the path like 'history' for
+        /userservice/history
+
+        :param config: dict like app_conf or plugin options
+        :param prefix: prefix of the settings like 'linotp_'
+        :return: RequestPolicy
+        """
+        def get(name, default):
+            value = _as_float(config.get(prefix + name))
+            if value is None:
+                return default
+            return value
+
+        endpoint_timeouts = {}
+        endpoint_prefix = prefix + 'timeout.'
+        for key, value in config.items():
+            if not key.startswith(endpoint_prefix) or not value:
+                continue
+            endpoint = key[len(endpoint_prefix):].strip('/')
+            parts = [_as_float(part.strip()) for part in value.split(',')]
+            if len(parts) == 1:
+                parts = [None, parts[0]]
+            endpoint_timeouts['/userservice/%s' % endpoint] = tuple(parts[:2])
+
+        return cls(connect_timeout=get('connect_timeout',
+                                       DEFAULT_CONNECT_TIMEOUT),
+                   read_timeout=get('read_timeout', DEFAULT_READ_TIMEOUT),
+                   endpoint_timeouts=endpoint_timeouts,
+                   deadline=get('deadline', DEFAULT_DEADLINE),
+                   retries=int(get('retries', DEFAULT_RETRIES)),
+                   retry_backoff=get('retry_backoff', DEFAULT_RETRY_BACKOFF))
+
+    def timeout_for(self, path):
+        """
+        :return: tuple of (connect timeout, read timeout) for the path
+        """
+        connect, read = self.endpoint_timeouts.get(path, (None, None))
+        if connect is None:
+            connect = self.connect_timeout
+        if read is None:
+            read = self.read_timeout
+        return connect, read
+
+    def retries_for(self, path):
+        if path in self.idempotent_paths:
+            return self.retries
+        return 0
+
+    def backoff(self, attempt):
+        """
+        jittered exponential backoff delay before the given retry
+        """
+        return random.uniform(0, self.retry_backoff * (2 ** (attempt - 1)))
+
+
+
+class _NoCookiesPolicy(DefaultCookiePolicy):
+    """
+    cookie policy, which stores no cookie - the user session cookies are
+    passed with every request and must not be kept in a shared session
+    """
+    def set_ok(self, cookie, request):
+        return False
+
+
+class _PoolSession(requests.Session):
+    """
+    requests Session without user state, which sends all requests through
+    the adapter of its ConnectionPool. It keeps the behaviour of a plain
+    Session - the default headers, the proxy and CA settings of the
+    environment and following redirects.
+    """
+    def __init__(self, pool):
+        super(_PoolSession, self).__init__()
+        self.pool = pool
+        self.cookies = RequestsCookieJar(policy=_NoCookiesPolicy())
+
+    def get_adapter(self, url):
+        return self.pool.get_adapter()
+
+
+class ConnectionPool(object):
+    """
+    A process wide pool of keep-alive connections to one LinOTP server.
+
+    The pool only holds transport state (sockets and TLS settings) and no
+    user specific data, so it can be shared by all controller instances and
+    threads. It wraps a requests HTTPAdapter, whose underlying urllib3 pool
+    manager is thread-safe, and a Session, which stores no cookies.
     """
     def __init__(
             self,
             base_url,
             server_cert=None,
             client_cert=None,
-            client_key=None
+            client_key=None,
+            pool_size=DEFAULT_POOL_SIZE,
+            keep_alive=True,
+            idle_timeout=DEFAULT_IDLE_TIMEOUT
             ):
         """
-        Creates a Connection object.
+        Creates a ConnectionPool object.
 
         :param base_url: Base URL of the type https://myserver.com/
-        :type base_url: string
         :param server_cert: Path to a server certificate
-        :type server_cert: string
         :param client_cert: Path to a client certificate
-        :type client_cert: string
         :param client_key: Path to a client key
-        :type client_key: string
+        :param pool_size: Maximum number of connections kept open
+        :param keep_alive: If False, every connection is closed after use
+        :param idle_timeout: Seconds after which an unused pool is dropped
         """
-        self._session = requests.Session()
         self.base_url = base_url
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+
+        self.verify = True
+        self.cert = None
+
         url_parts = urlparse(base_url)
         protocol = url_parts[0].lower()
         if protocol == 'https':
             if server_cert and client_cert and client_key:
-                self._session.verify = server_cert
-                self._session.cert = (client_cert, client_key)
+                self.verify = server_cert
+                self.cert = (client_cert, client_key)
             else:
                 LOG.warning("Using https without certificates is a security risk.")
         else:
             LOG.warning("Using http is a security risk.")
+
+        self._lock = threading.Lock()
+        self._adapter = None
+        self._session = _PoolSession(self)
+        self.last_used = time.time()
+
+    def _new_adapter(self):
+        return HTTPAdapter(pool_connections=1,
+                           pool_maxsize=self.pool_size,
+                           pool_block=False)
+
+    def get_adapter(self):
+        """
+        return the shared adapter - if the pool has been idle for longer
+        than the idle_timeout the open connections are dropped first, as
+        the server has most probably closed them already
+        """
+        with self._lock:
+            now = time.time()
+            if self._adapter and now - self.last_used > self.idle_timeout:
+                LOG.debug("reaping idle connections to %s", self.base_url)
+                self._adapter.close()
+                self._adapter = None
+            if self._adapter is None:
+                self._adapter = self._new_adapter()
+            self.last_used = now
+            return self._adapter
+
+    def is_idle(self, now=None):
+        if now is None:
+            now = time.time()
+        return now - self.last_used > self.idle_timeout
+
+    def close(self):
+        with self._lock:
+            if self._adapter:
+                self._adapter.close()
+                self._adapter = None
+
+    def send(self, method, url, params=None, data=None, headers=None,
+             cookies=None, **kwargs):
+        """
+        send a request through the pooled connections
+
+        :return: requests.Response
+        """
+        headers = dict(headers or {})
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+
+        session = self._session
+        prepared = session.prepare_request(
+                            requests.Request(method, url,
+                                             params=params,
+                                             data=data,
+                                             headers=headers,
+                                             cookies=cookies))
+
+        # proxies and the CA bundle are taken from the environment
+        settings = session.merge_environment_settings(
+                            prepared.url, {}, kwargs.pop('stream', None),
+                            self.verify, self.cert)
+        settings.update(kwargs)
+        return session.send(prepared, **settings)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _given(args):
+    """
+    :return: the arguments without those left to their default by None
+    """
+    return dict((k, v) for k, v in (args or {}).items() if v is not None)
+
+
+def _settings_key(args):
+    """
+    :return: a hashable key of keyword arguments, which may contain dicts
+             like the breaker_args
+    """
+    return tuple(sorted((k, _settings_key(v) if isinstance(v, dict) else v)
+                        for k, v in args.items()))
+
+
+def get_pool(base_url, server_cert=None, client_cert=None, client_key=None,
+             **pool_args):
+    """
+    get the process wide connection pool for the given server and
+    certificate settings - the pool is created on first use.
+    Pools which have not been used for their idle_timeout are reaped.
+
+    :param pool_args: pool_size, keep_alive, idle_timeout - callers with
+                      other pool settings get a pool of their own
+    :return: ConnectionPool
+    """
+    pool_args = _given(pool_args)
+    key = (base_url, server_cert, client_cert, client_key,
+           _settings_key(pool_args))
+    now = time.time()
+    with _pools_lock:
+        for pool_key in [k for k, p in _pools.items()
+                         if k != key and p.is_idle(now)]:
+            _pools.pop(pool_key).close()
+
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(base_url,
+                                  server_cert=server_cert,
+                                  client_cert=client_cert,
+                                  client_key=client_key,
+                                  **pool_args)
+            _pools[key] = pool
+    return pool
+
+
+def close_pools():
+    """
+    close all pooled connections of this process
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+class Backend(object):
+    """
+    One LinOTP server of the balancer with its load and health state
+    """
+    def __init__(self, base_url, server_cert=None, client_cert=None,
+                 client_key=None, pool_args=None):
+        self.base_url = base_url
+        self.server_cert = server_cert
+        self.client_cert = client_cert
+        self.client_key = client_key
+        self.pool_args = pool_args or {}
+
+        self.outstanding = 0
+        self.latency = None
+        self.healthy = True
+
+    @property
+    def pool(self):
+        return get_pool(self.base_url,
+                        server_cert=self.server_cert,
+                        client_cert=self.client_cert,
+                        client_key=self.client_key,
+                        **self.pool_args)
+
+    def __repr__(self):
+        return '<%s %s healthy=%r outstanding=%d latency=%r>' % (
+                    self.__class__.__name__, self.base_url, self.healthy,
+                    self.outstanding, self.latency)
+
+
+class Balancer(object):
+    """
+    Distributes the requests over several LinOTP servers.
+
+    A backend is picked by the least number of outstanding requests or by
+    the moving average of its latency weighted with its outstanding
+    requests. Backends failing with connection errors are taken out of
+    rotation; a background thread probes all backends and brings them back
+    once they respond again.
+    """
+    def __init__(self, base_urls, server_cert=None, client_cert=None,
+                 client_key=None, pool_args=None,
+                 strategy=LEAST_OUTSTANDING,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+                 health_check_path=DEFAULT_HEALTH_CHECK_PATH,
+                 health_check_timeout=DEFAULT_HEALTH_CHECK_TIMEOUT,
+                 breaker_args=None):
+        """
+        Creates a Balancer object.
+
+        :param base_urls: list of base URLs of the LinOTP servers
+        :param server_cert: Path to a server certificate
+        :param client_cert: Path to a client certificate
+        :param client_key: Path to a client key
+        :param pool_args: settings of the connection pools
+        :param strategy: 'least_outstanding' or 'ewma'
+        :param health_check_interval: seconds between the health probes,
+                                      0 disables the probes
+        :param health_check_path: path, which is requested by the probes
+        :param health_check_timeout: timeout of a health probe
+        :param breaker_args: settings of the circuit breaker, which guards
+                             all servers of the balancer
+        """
+        if strategy not in (LEAST_OUTSTANDING, EWMA):
+            raise ValueError("unknown balancer strategy %r" % strategy)
+
+        self.backends = [Backend(url,
+                                 server_cert=server_cert,
+                                 client_cert=client_cert,
+                                 client_key=client_key,
+                                 pool_args=pool_args)
+                         for url in base_urls]
+        if not self.backends:
+            raise ValueError("no LinOTP server defined")
+
+        self.strategy = strategy
+        self.health_check_interval = health_check_interval
+        self.health_check_path = health_check_path
+        self.health_check_timeout = health_check_timeout
+
+        breaker_args = dict((k, v) for k, v in (breaker_args or {}).items()
+                            if v is not None)
+        self.breaker = CircuitBreaker(name=', '.join(base_urls),
+                                      **breaker_args)
+
+        self._lock = threading.Lock()
+        self._prober = None
+        self._prober_pid = None
+        self._stopped = threading.Event()
+
+    def _score(self, backend):
+        if self.strategy == EWMA:
+            return (backend.latency or 0.0) * (backend.outstanding + 1)
+        return backend.outstanding
+
+    def acquire(self):
+        """
+        select a backend for the next request - if all backends are down,
+        all are taken into account, so the request fails with the original
+        connection error instead of silently
+
+        :return: Backend, which has to be returned with release()
+        """
+        self._ensure_prober()
+        with self._lock:
+            candidates = [b for b in self.backends if b.healthy]
+            if not candidates:
+                candidates = self.backends
+            backend = min(candidates, key=self._score)
+            backend.outstanding += 1
+        return backend
+
+    def release(self, backend, latency=None, failed=False):
+        """
+        return the backend after the request and record its latency
+
+        :param latency: seconds the request took, None if it failed
+        :param failed: the backend could not be reached
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            if latency is not None:
+                if backend.latency is None:
+                    backend.latency = latency
+                else:
+                    backend.latency = (EWMA_DECAY * latency +
+                                       (1 - EWMA_DECAY) * backend.latency)
+        if failed:
+            self.mark(backend, False)
+
+    def mark(self, backend, healthy):
+        if backend.healthy != healthy:
+            if healthy:
+                LOG.info("LinOTP server %s is back in rotation",
+                         backend.base_url)
+            else:
+                LOG.warning("LinOTP server %s is taken out of rotation",
+                            backend.base_url)
+        backend.healthy = healthy
+
+    def probe(self, backend):
+        """
+        check if the backend responds - any response without a server
+        error counts as healthy
+        """
+        try:
+            response = backend.pool.send(
+                'GET', backend.base_url + self.health_check_path,
+                timeout=(self.health_check_timeout,
+                         self.health_check_timeout))
+            response.close()
+            healthy = response.status_code < 500
+        except requests.exceptions.RequestException as exx:
+            LOG.debug("health check of %s failed: %r", backend.base_url, exx)
+            healthy = False
+        self.mark(backend, healthy)
+        return healthy
+
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def _run_prober(self):
+        while not self._stopped.wait(self.health_check_interval):
+            self.probe_all()
+
+    def _ensure_prober(self):
+        """
+        start the health check thread lazily - and again in a forked
+        worker process, as threads do not survive the fork
+        """
+        if len(self.backends) < 2 or not self.health_check_interval:
+            return
+        if self._prober_pid == os.getpid():
+            return
+        with self._lock:
+            if self._prober_pid == os.getpid():
+                return
+            self._prober = threading.Thread(target=self._run_prober,
+                                            name='linotp-health-check')
+            self._prober.daemon = True
+            self._prober.start()
+            self._prober_pid = os.getpid()
+
+    def stop(self):
+        self._stopped.set()
+
+
+_balancers = {}
+_balancers_lock = threading.Lock()
+
+
+def get_balancer(base_urls, server_cert=None, client_cert=None,
+                 client_key=None, pool_args=None, **balancer_args):
+    """
+    get the process wide balancer for the given servers and certificate
+    settings - the balancer is created on first use
+
+    :param pool_args: settings of the connection pools
+    :param balancer_args: strategy, health check and breaker settings -
+                          callers with other settings get a balancer of
+                          their own
+    :return: Balancer
+    """
+    pool_args = _given(pool_args)
+    balancer_args = _given(balancer_args)
+    if 'breaker_args' in balancer_args:
+        balancer_args['breaker_args'] = _given(balancer_args['breaker_args'])
+    key = (tuple(base_urls), server_cert, client_cert, client_key,
+           _settings_key(pool_args), _settings_key(balancer_args))
+    with _balancers_lock:
+        balancer = _balancers.get(key)
+        if balancer is None:
+            balancer = Balancer(base_urls,
+                                server_cert=server_cert,
+                                client_cert=client_cert,
+                                client_key=client_key,
+                                pool_args=pool_args,
+                                **balancer_args)
+            _balancers[key] = balancer
+    return balancer
+
+
+def breaker_states():
+    """
+    :return: list with the state of the circuit breakers of this process
+    """
+    with _balancers_lock:
+        balancers = list(_balancers.values())
+    return [balancer.breaker.status() for balancer in balancers]
+
+
+class ResponseSizes(object):
+    """
+    Moving average of the response size per path, which decides if a
+    compressed response is requested: compressing small replies costs more
+    CPU time on both sides than it saves on the wire.
+    """
+    def __init__(self):
+        self._sizes = {}
+
+    def expected(self, path):
+        """
+        :return: expected size in bytes or None, if the path is unknown
+        """
+        return self._sizes.get(path)
+
+    def record(self, path, size, wire_size=None):
+        """
+        register the decoded size of a response
+
+        :param size: size of the decoded body
+        :param wire_size: size of the body as transferred, if known
+        """
+        expected = self._sizes.get(path)
+        if expected is None:
+            self._sizes[path] = float(size)
+        else:
+            self._sizes[path] = EWMA_DECAY * size + (1 - EWMA_DECAY) * expected
+
+        if wire_size and wire_size != size:
+            LOG.debug("%s: %d bytes transferred compressed as %d bytes",
+                      path, size, wire_size)
+
+    def accept_compressed(self, path, threshold):
+        """
+        check if a compressed response should be requested for the path -
+        unknown paths are requested compressed
+        """
+        expected = self.expected(path)
+        return expected is None or expected >= threshold
+
+
+# process wide statistics of the response sizes
+response_sizes = ResponseSizes()
+
+
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+
+# separators of the fields in an urlencoded form as understood by cgi
+_form_separator = re.compile(r'[&;]')
+
+
+def encode_form(params):
+    """
+    urlencode the parameters - unicode values are sent utf-8 encoded
+
+    :param params: dict of parameters
+    :return: urlencoded string
+    """
+    fields = []
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        fields.append((key, value))
+    return urlencode(fields)
+
+
+def merge_form(form, params=None, exclude=()):
+    """
+    add parameters to an urlencoded form without decoding its values
+
+    Fields of the form with the name of a parameter or an excluded name
+    are dropped, so the server controlled parameters can not be overridden
+    or duplicated by the client. Only the field names are decoded for the
+    comparison, as an encoded name is the same field for the receiver.
+
+    :param form: urlencoded form like a request body or query string
+    :param params: dict of parameters, which are appended
+    :param exclude: names of fields, which are removed
+    :return: urlencoded string
+    """
+    params = params or {}
+    names = set(params.keys()) | set(exclude)
+
+    fields = []
+    for field in _form_separator.split(form or ''):
+        if not field:
+            continue
+        if names and unquote_plus(field.split('=', 1)[0]) in names:
+            continue
+        fields.append(field)
+
+    if params:
+        fields.append(encode_form(params))
+
+    return '&'.join(field for field in fields if field)
+
+
+def _user_session(session, user):
+    """
+    build the request parameters and cookies for a user session
+
+    :return: tuple of (params, cookies)
+    """
+    params = {}
+    cookies = {}
+    if session:
+        params['session'] = session
+        cookies['userauthcookie'] = session
+    if user:
+        params['user'] = user
+    return params, cookies
+
+
+class Connection(object):
+    """
+    Represents a HTTP connection that can send requests repeatedly.
+
+    The Connection itself is lightweight and only holds the per user
+    defaults (user and session). The transport is taken from the process
+    wide Balancer and its ConnectionPools, which are shared with all other
+    Connection objects for the same servers and certificates.
+    """
+    def __init__(
+            self,
+            base_url,
+            server_cert=None,
+            client_cert=None,
+            client_key=None,
+            pool_size=None,
+            keep_alive=None,
+            idle_timeout=None,
+            policy=None,
+            strategy=None,
+            health_check_interval=None,
+            health_check_path=None,
+            health_check_timeout=None,
+            breaker_args=None,
+            compression_threshold=None
+            ):
+        """
+        Creates a Connection object.
+
+        :param base_url: Base URL of the type https://myserver.com/ or a
+            list of them, if the requests should be balanced over several
+            LinOTP servers
+        :type base_url: string or list
+        :param server_cert: Path to a server certificate
+        :type server_cert: string
+        :param client_cert: Path to a client certificate
+        :type client_cert: string
+        :param client_key: Path to a client key
+        :type client_key: string
+        :param pool_size: size of the shared connection pool
+        :type pool_size: int
+        :param keep_alive: keep the upstream connections open
+        :type keep_alive: bool
+        :param idle_timeout: seconds after which idle connections are dropped
+        :type idle_timeout: int
+        :param policy: timeouts and retries of the requests
+        :type policy: RequestPolicy
+        :param strategy: balancer strategy 'least_outstanding' or 'ewma'
+        :type strategy: string
+        :param health_check_interval: seconds between the health probes
+        :type health_check_interval: float
+        :param health_check_path: path requested by the health probes
+        :type health_check_path: string
+        :param health_check_timeout: timeout of the health probes
+        :type health_check_timeout: float
+        :param breaker_args: settings of the circuit breaker
+        :type breaker_args: dict
+        :param compression_threshold: request gzip or deflate compressed
+            responses, if the response of the path is expected to be at
+            least this number of bytes - None disables the compression
+        :type compression_threshold: int
+        """
+        if isinstance(base_url, basestring):
+            base_urls = split_urls(base_url)
+        else:
+            base_urls = [url.rstrip('/') for url in base_url]
+        self.base_url = base_urls[0] if base_urls else base_url
+        self.policy = policy or RequestPolicy()
+        self.compression_threshold = compression_threshold
+        self._balancer = get_balancer(
+                            base_urls,
+                            server_cert=server_cert,
+                            client_cert=client_cert,
+                            client_key=client_key,
+                            pool_args=dict(pool_size=pool_size,
+                                           keep_alive=keep_alive,
+                                           idle_timeout=idle_timeout),
+                            strategy=strategy,
+                            health_check_interval=health_check_interval,
+                            health_check_path=health_check_path,
+                            health_check_timeout=health_check_timeout,
+                            breaker_args=breaker_args)
+        self._params = {}
+        self._cookies = {}
         self.is_user_session_set = False
 
     def set_user_session(self, session, user):
@@ -78,12 +853,9 @@ class Connection(object):
         This is an optional convenience method that can be used to set the
         session parameter, session cookie and user parameter for the complete
         lifetime of the Connection object.
-        It takes advantage of the fact that requests.Session can store default
-        values that are added to every request. This is even more true for
-        Cookies, which are stored automatically in the Session object if any
-        request returns a Cookie.
-        The values are overwritten if something of the same name is supplied
-        when making a request.
+        The values are only stored in this Connection object and not in the
+        shared connection pool. They are overwritten if something of the same
+        name is supplied when making a request.
 
         :param session: A session string that will be included as default value
             in every request as a parameter and that will be used to create a
@@ -97,45 +869,213 @@ class Connection(object):
             calling post() method).
         :type user: string
         """
-        if session:
-            self._session.params.update(dict(session=session))
-            self._session.cookies.set('userauthcookie', session)
-        if user:
-            self._session.params.update(dict(user=user))
+        params, cookies = _user_session(session, user)
+        self._params.update(params)
+        self._cookies.update(cookies)
         if session or user:
             self.is_user_session_set = True
 
-    def post(self, path, params=None, headers=None):
+    def post(self, path, params=None, headers=None, session=None, user=None,
+             deadline=None, stream=False, form=None):
         """
         Send a POST request to self.base_url + path.
 
+        The parameters are sent urlencoded in the request body.
+
+        Requests to idempotent paths are retried on connection errors and
+        gateway errors, as long as the retry budget and deadline allow.
+
         :param path: The URL part following the base_url
         :type path: string
         :param params: Parameters for the request
         :type params: dict
         :param headers: Headers for the request
         :type headers: dict
+        :param session: user session for this request only - overrides the
+            default set by set_user_session without changing it. This allows
+            one Connection to be shared by concurrent requests of different
+            users.
+        :type session: string
+        :param user: user for this request only
+        :type user: string
+        :param deadline: seconds the request including all retries may take,
+            defaults to the deadline of the policy
+        :type deadline: float
+        :param stream: only read the response headers - the body has to be
+            consumed with Response.iter_body() or the Response closed
+        :type stream: bool
+        :param form: an urlencoded form, which is forwarded as it is - only
+            the params, the user and the session are added or replaced
+        :type form: string
+        """
+        request_params = dict(self._params)
+        cookies = dict(self._cookies)
+
+        user_params, user_cookies = _user_session(session, user)
+        request_params.update(user_params)
+        cookies.update(user_cookies)
+
+        if params:
+            request_params.update(params)
+
+        body = merge_form(form, request_params)
+
+        headers = dict(headers or {})
+        header_names = set(name.lower() for name in headers)
+        if 'content-type' not in header_names:
+            headers['Content-Type'] = FORM_CONTENT_TYPE
+
+        if (self.compression_threshold is not None and
+                'accept-encoding' not in header_names):
+            if response_sizes.accept_compressed(path,
+                                                self.compression_threshold):
+                headers['Accept-Encoding'] = ACCEPT_COMPRESSED
+            else:
+                headers['Accept-Encoding'] = 'identity'
+
+        if deadline is None:
+            deadline = self.policy.deadline
+
+        # fail fast while LinOTP is known to be unavailable
+        breaker = self._balancer.breaker
+        breaker.allow()
+
+        start = time.time()
+        try:
+            response, attempts = self._send(path, body, headers,
+                                            cookies, deadline, start,
+                                            stream=stream)
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        elapsed = time.time() - start
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success(elapsed)
+
+        net_response = Response(response,
+                                elapsed=elapsed,
+                                deadline=deadline,
+                                attempts=attempts,
+                                path=path)
+        if not stream:
+            net_response.record_size(len(response.content))
+
+        return net_response
+
+    def _send(self, path, body, headers, cookies, deadline, start,
+              stream=False):
+        """
+        send the request to one of the balanced servers and retry it, if
+        the policy and the deadline allow
+
+        :return: tuple of the requests.Response and the number of attempts
         """
-        response = self._session.post(
-            self.base_url + path,
-            params=params,
-            headers=headers,
-            )
-        return Response(response)
-        
+        retries = self.policy.retries_for(path)
+
+        attempt = 0
+        while True:
+            connect_timeout, read_timeout = self.policy.timeout_for(path)
+            if deadline:
+                remaining = deadline - (time.time() - start)
+                if remaining <= 0:
+                    raise DeadlineExceeded("deadline of %.2fs exceeded for %s"
+                                           % (deadline, path))
+                connect_timeout = min(connect_timeout, remaining)
+                read_timeout = min(read_timeout, remaining)
+
+            backend = self._balancer.acquire()
+            sent = time.time()
+            try:
+                response = backend.pool.send(
+                    'POST',
+                    backend.base_url + path,
+                    data=body,
+                    headers=headers,
+                    cookies=cookies,
+                    timeout=(connect_timeout, read_timeout),
+                    stream=stream,
+                    )
+                self._balancer.release(backend, latency=time.time() - sent)
+
+                if (response.status_code not in RETRY_STATUS_CODES
+                        or attempt >= retries):
+                    break
+                response.close()
+                LOG.warning("%s%s returned %s - retrying", backend.base_url,
+                            path, response.status_code)
+
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as exx:
+                # a read timeout is no proof of a dead server
+                failed = not isinstance(exx, requests.exceptions.ReadTimeout)
+                self._balancer.release(backend, failed=failed)
+                if attempt >= retries:
+                    raise
+                LOG.warning("%s%s failed: %r - retrying", backend.base_url,
+                            path, exx)
+
+            except Exception:
+                self._balancer.release(backend)
+                raise
+
+            attempt += 1
+            delay = self.policy.backoff(attempt)
+            if deadline:
+                delay = min(delay, max(0, deadline - (time.time() - start)))
+            time.sleep(delay)
+
+        return response, attempt + 1
+
 
 class Response(object):
     """
     Represents a HTTP response object (wrapper for requests.Response).
     """
-    def __init__(self, response):
+    def __init__(self, response, elapsed=None, deadline=None, attempts=1,
+                 path=None):
         """
         Creates a Response() object.
 
         :param response: A requests.Response object to be wrapped
         :type response: requests.Response
+        :param elapsed: seconds the request took including all retries
+        :type elapsed: float
+        :param deadline: the deadline of the request in seconds
+        :type deadline: float
+        :param attempts: number of attempts made for the request
+        :type attempts: int
+        :param path: the requested path, used for the size statistics
+        :type path: string
         """
         self._response = response
+        self.elapsed = elapsed
+        self.deadline = deadline
+        self.attempts = attempts
+        self.path = path
+
+    def record_size(self, size):
+        """
+        register the size of the decoded body for the compression decision
+        """
+        if self.path is None:
+            return
+        wire_size = None
+        raw = getattr(self._response, 'raw', None)
+        if hasattr(raw, 'tell'):
+            wire_size = raw.tell()
+        response_sizes.record(self.path, size, wire_size)
+
+    @property
+    def deadline_used(self):
+        """
+        the fraction of the deadline used by the request or None
+        """
+        if not self.deadline or self.elapsed is None:
+            return None
+        return self.elapsed / self.deadline
 
     @property
     def status_code(self):
@@ -145,11 +1085,48 @@ class Response(object):
     def reason(self):
         return self._response.reason
 
+    @property
+    def headers(self):
+        return self._response.headers
+
+    @property
+    def content_type(self):
+        return self._response.headers.get('Content-Type')
+
     def json(self):
         return self._response.json()
 
     def text(self):
         return self._response.text
 
+    def content(self):
+        """
+        :return: the body as byte string without any decoding of the charset
+        """
+        return self._response.content
+
+    def iter_body(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        iterate over the body of a streamed response without loading it
+        into memory. The bytes are passed unchanged, only a content
+        encoding like gzip is decoded on the fly. The connection is returned
+        to the pool, when the iteration ends or the iterator is closed.
+
+        :param chunk_size: maximum size of the chunks in bytes
+        :return: generator of byte strings
+        """
+        size = 0
+        try:
+            for chunk in self._response.iter_content(chunk_size):
+                if chunk:
+                    size += len(chunk)
+                    yield chunk
+            self.record_size(size)
+        finally:
+            self._response.close()
+
+    def close(self):
+        self._response.close()
+
     def get_cookie(self, name):
         return self._response.cookies[name]
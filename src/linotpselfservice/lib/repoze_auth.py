@@ -26,62 +26,36 @@
 """ user authentication with repoze module """
 
 
-import os
 import logging
 
 from zope.interface import implements
 from repoze.who.interfaces import IAuthenticator
 from repoze.who.interfaces import IMetadataProvider
 from linotpselfservice.lib.network import Connection
+from linotpselfservice.config import environment
+from linotpselfservice.lib.settings import Settings
+from linotpselfservice.lib.settings import plugin_settings
+from linotpselfservice.lib.singleflight import upstream_flights
+from linotpselfservice.lib.cache import userinfo_cache
 
 log = logging.getLogger(__name__)
 
+
 class LinOTPUserAuthPlugin(object):
 
     implements(IAuthenticator)
 
-    def __init__(self, linotp_url, client_cert=None, client_key=None,
-                 server_cert=None):
-        self.conn = None
-
-        self.base_url = linotp_url.strip('/')
-
-        # load keyfile
-        self.client_key = None
-        # replace the app root %here% if any
-        if client_key and '%(here)s' in client_key:
-            client_key = client_key.replace('%(here)s', self.here)
-
-        if client_key:
-            if os.path.exists(client_key):
-                self.client_key = client_key
-            else:
-                log.error("key_file %s could not be found", client_key)
-
-        # load the client certificate file
-        self.client_cert = None
-        # replace the app root %here% if any
-        if client_cert and '%(here)s' in client_cert:
-            client_cert = client_cert.replace('%(here)s', self.here)
-
-        if client_cert:
-            if os.path.exists(client_cert):
-                self.client_cert = client_cert
-            else:
-                log.error("cert_file %s could not be found", client_cert)
-
-        # load the server certificate file
-        self.server_cert = None
-        # replace the app root %here% if any
-        if server_cert and '%(here)s' in server_cert:
-            server_cert = server_cert.replace('%(here)s', self.here)
-
-        if server_cert:
-            if os.path.exists(server_cert):
-                self.server_cert = server_cert
-            else:
-                log.error("cert_file %s could not be found", server_cert)
+    def __init__(self, settings):
+        """
+        :param settings: the checked connection Settings of the plugin
+        """
+        self.settings = settings
 
+        # the plugin is shared by all threads and identities of the
+        # process, so the connection must not hold any user session - the
+        # user and session are passed in with every request
+        self.conn = Connection(list(settings.base_urls),
+                               **settings.connection_args())
 
     # IAuthenticatorPlugin
     def authenticate(self, environ, identity):
@@ -101,13 +75,6 @@ class LinOTPUserAuthPlugin(object):
         password = identity['password']
 
         try:
-            if not self.conn:
-                self.conn = Connection(
-                    self.base_url,
-                    server_cert=self.server_cert,
-                    client_cert=self.client_cert,
-                    client_key=self.client_key
-                    )
             params = {'login':login, 'password': password}
             headers = {"Content-type": "application/x-www-form-urlencoded",
                        "Accept": "text/plain"}
@@ -149,10 +116,9 @@ class LinOTPUserModelPlugin(LinOTPUserAuthPlugin):
 
     implements(IMetadataProvider)
 
-    def __init__(self, linotp_url, client_cert=None, client_key=None,
-                 server_cert=None):
+    def __init__(self, settings):
         self.parent = super(LinOTPUserModelPlugin, self)
-        self.parent.__init__(linotp_url, client_cert, client_key, server_cert)
+        self.parent.__init__(settings)
 
     # IMetadataProvider
     def add_metadata(self, environ, identity):
@@ -173,43 +139,50 @@ class LinOTPUserModelPlugin(LinOTPUserAuthPlugin):
         # on logout, there is no login and thus just return a None
         path = environ.get('PATH_INFO', '/logout')
         if '/logout' in path:
+            if identity and identity.get('repoze.who.userid'):
+                userinfo_cache.invalidate(identity['repoze.who.userid'])
             return None
 
         # due to the requirement to transfer info back from repoze
         # authentication, we have to deal with the ::ERROR:: user
         if (identity
-            and "::ERROR::" in identity.get('repoze.who.user', '::ERROR::')):
+            and "::ERROR::" in identity.get('repoze.who.userid', '::ERROR::')):
             return None
 
         try:
-            if not self.conn:
-                self.conn = Connection(
-                    self.base_url,
-                    server_cert=self.server_cert,
-                    client_cert=self.client_cert,
-                    client_key=self.client_key
-                    )
-
             if environ.get('HTTP_ACCEPT_LANGUAGE', None):
                 headers['Accept-Language'] = environ.get('HTTP_ACCEPT_LANGUAGE', None)
 
-            if not self.conn.is_user_session_set:
-                # for the authetication we take the 'repoze.who.userid' as it
-                # is the one which is returned from the authenticate call
-                # extended by the realm and joined with the auth_cookie
-                if ';' in identity['repoze.who.userid']:
-                    user, session = identity['repoze.who.userid'].split(';', 1)
-                    self.conn.set_user_session(session, user)
-                else:
-                    user = identity['repoze.who.userid']
-                    self.conn.set_user_session(None, user)
+            # for the authetication we take the 'repoze.who.userid' as it
+            # is the one which is returned from the authenticate call
+            # extended by the realm and joined with the auth_cookie
+            if ';' in identity['repoze.who.userid']:
+                user, session = identity['repoze.who.userid'].split(';', 1)
+            else:
+                user = identity['repoze.who.userid']
+                session = None
 
             path = "/userservice/userinfo"
-            response = self.conn.post(path, params=params, headers=headers)
 
-            if response.status_code == 200:
-                res = response.json()
-                user_data = res.get('result', {}).get('value', [])
+            # the user info is cached per login and upstream session - a
+            # fresh login replaces the cached entry
+            userid = identity['repoze.who.userid']
+            user_data = None
+            if 'password' not in identity:
+                user_data = userinfo_cache.get(userid)
+
+            if user_data is None:
+                # concurrent requests of the same user share one upstream
+                # call
+                key = (path, user, session, headers.get('Accept-Language'))
+                user_data = upstream_flights.do(
+                                path, key,
+                                lambda: self._get_userinfo(path, params,
+                                                           headers,
+                                                           session, user))
+                if user_data is not None:
+                    userinfo_cache.set(userid, user_data)
+            if user_data is not None:
                 if type(user_data) in [dict]:
                     identity.update(user_data)
 
@@ -220,36 +193,40 @@ class LinOTPUserModelPlugin(LinOTPUserAuthPlugin):
             log.error("[add_metadata] %r" % exx)
             return "::ERROR:: Connection failed!"
 
+    def _get_userinfo(self, path, params, headers, session, user):
+        """
+        :return: the user info or None, if the request failed
+        """
+        response = self.conn.post(path, params=params, headers=headers,
+                                  session=session, user=user)
+        if response.status_code != 200:
+            return None
+        res = response.json()
+        return res.get('result', {}).get('value', [])
+
     def __repr__(self):
         return '<%s %s>' % (self.__class__.__name__,
                             id(self))
 
-def make_auth_plugin(
-        linotp_url,
-        client_cert=None,
-        client_key=None,
-        server_cert=None
-        ):
-    # we could check here, if the cert and key file are avail and accessible
-    plugin = LinOTPUserAuthPlugin(
-        linotp_url,
-        client_cert=client_cert,
-        client_key=client_key,
-        server_cert=server_cert
-        )
+def _plugin_settings(options):
+    """
+    the plugins share the settings of the application, which the plugin
+    options have to agree with - without the application, the plugin
+    options are used alone. The settings and cert files are checked once,
+    when the plugin is created - the ini parser of repoze.who has replaced
+    %(here)s
+    """
+    config = environment.app_config
+    if config is None:
+        return Settings.from_config(options, prefix='')
+    return plugin_settings(config['pylons.app_globals'].settings,
+                           config['app_conf'], options,
+                           here=config.get('here'))
+
+def make_auth_plugin(**options):
+    plugin = LinOTPUserAuthPlugin(_plugin_settings(options))
     return plugin
 
-def make_modl_plugin(
-        linotp_url,
-        client_cert=None,
-        client_key=None,
-        server_cert=None
-        ):
-    # we could check here, if the cert and key file are avail and accessible
-    plugin = LinOTPUserModelPlugin(
-        linotp_url,
-        client_cert=client_cert,
-        client_key=client_key,
-        server_cert=server_cert
-        )
+def make_modl_plugin(**options):
+    plugin = LinOTPUserModelPlugin(_plugin_settings(options))
     return plugin
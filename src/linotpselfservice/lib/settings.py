@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the settings of the connection to the LinOTP servers
+
+The settings are read and checked once, when the application is loaded -
+the controllers and the repoze.who plugins only read the resulting
+Settings object. A bad setting, like a missing certificate file or an
+unknown balancer strategy, stops the start of the application with a
+ConfigurationError instead of failing on every request.
+"""
+
+import os
+import logging
+
+from paste.deploy.converters import asbool, asint
+
+from linotpselfservice.lib.network import RequestPolicy
+from linotpselfservice.lib.network import split_urls
+from linotpselfservice.lib.network import DEFAULT_POOL_SIZE
+from linotpselfservice.lib.network import DEFAULT_IDLE_TIMEOUT
+from linotpselfservice.lib.network import DEFAULT_CHUNK_SIZE
+from linotpselfservice.lib.network import DEFAULT_COMPRESSION_THRESHOLD
+from linotpselfservice.lib.network import DEFAULT_HEALTH_CHECK_INTERVAL
+from linotpselfservice.lib.network import DEFAULT_HEALTH_CHECK_PATH
+from linotpselfservice.lib.network import LEAST_OUTSTANDING
+from linotpselfservice.lib.network import EWMA
+from linotpselfservice.lib.breaker import DEFAULT_FAILURE_THRESHOLD
+from linotpselfservice.lib.breaker import DEFAULT_LATENCY_THRESHOLD
+from linotpselfservice.lib.breaker import DEFAULT_RESET_TIMEOUT
+from linotpselfservice.lib.breaker import DEFAULT_HALF_OPEN_CALLS
+
+log = logging.getLogger(__name__)
+
+# the settings, which are named alike in the application ini and the
+# plugin options of the who.ini
+FILE_SETTINGS = ('client_key', 'client_cert', 'server_cert')
+LOCATION_SETTINGS = ('linotp_url',) + FILE_SETTINGS
+
+
+class ConfigurationError(Exception):
+    """
+    Exception raised, when the application is started with a bad setting
+    """
+    pass
+
+
+class Settings(object):
+    """
+    read only settings of the connection to the LinOTP servers
+
+    The settings are shared by all threads of the process, so they can not
+    be changed after they are created.
+    """
+
+    def __init__(self, **settings):
+        for name, value in settings.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("settings are read only: %s" % name)
+
+    def __delattr__(self, name):
+        raise AttributeError("settings are read only: %s" % name)
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.linotp_url)
+
+    def differences(self, other):
+        """
+        compare the settings with other settings - the servers by their
+        urls, the certificates by their files and the request policy by
+        its values
+
+        :return: sorted list of the names of the differing settings
+        """
+        names = set(vars(self)) | set(vars(other))
+        names.discard('linotp_url')
+
+        differing = []
+        for name in names:
+            mine = getattr(self, name, None)
+            theirs = getattr(other, name, None)
+            if name in FILE_SETTINGS:
+                mine = mine and os.path.realpath(mine)
+                theirs = theirs and os.path.realpath(theirs)
+            elif isinstance(mine, RequestPolicy):
+                mine = vars(mine)
+                theirs = vars(theirs) if theirs is not None else None
+            if mine != theirs:
+                differing.append(name.lstrip('_'))
+        return sorted(differing)
+
+    @property
+    def breaker_args(self):
+        """
+        the circuit breaker settings as keyword arguments - a copy, so that
+        a caller can not change the shared settings
+        """
+        return dict(self._breaker_args)
+
+    def connection_args(self):
+        """
+        the keyword arguments of the network Connection to the LinOTP
+        servers
+        """
+        return dict(server_cert=self.server_cert,
+                    client_cert=self.client_cert,
+                    client_key=self.client_key,
+                    pool_size=self.pool_size,
+                    keep_alive=self.pool_keep_alive,
+                    idle_timeout=self.pool_idle_timeout,
+                    policy=self.request_policy,
+                    strategy=self.balancer_strategy,
+                    health_check_interval=self.health_check_interval,
+                    health_check_path=self.health_check_path,
+                    breaker_args=self.breaker_args,
+                    compression_threshold=self.compression_threshold)
+
+    @classmethod
+    def from_config(cls, config, here=None, prefix='linotp_'):
+        """
+        create the settings from the ini settings
+
+        The location and certificate settings are the same in the
+        application and the plugin options of the who.ini, while the tuning
+        settings are prefixed in the application ini:
+
+            linotp_url = https://linotp1/, https://linotp2/
+            client_cert, client_key, server_cert = <path>
+            <prefix>pool_size, <prefix>pool_keep_alive,
+            <prefix>pool_idle_timeout
+            <prefix>stream_chunk_size
+            <prefix>compression, <prefix>compression_threshold
+            <prefix>balancer, <prefix>health_check_interval,
+            <prefix>health_check_path
+            <prefix>breaker_failures, <prefix>breaker_latency,
+            <prefix>breaker_reset_timeout, <prefix>breaker_half_open_calls
+            and the timeouts of the RequestPolicy
+
+        :param config: dict like app_conf or plugin options
+        :param here: directory of the ini file, which replaces %(here)s in
+                     the certificate paths
+        :param prefix: prefix of the tuning settings like 'linotp_'
+        :return: Settings
+        :raises ConfigurationError: if a setting is missing or invalid
+        """
+
+        def get(name, default=None):
+            value = config.get(prefix + name)
+            if value is None or value == '':
+                return default
+            return value
+
+        def convert(converter, name, default):
+            value = get(name, default)
+            try:
+                return converter(value)
+            except (TypeError, ValueError):
+                raise ConfigurationError("invalid value of %s%s: %r"
+                                         % (prefix, name, value))
+
+        linotp_url = config.get('linotp_url')
+        base_urls = split_urls(linotp_url)
+        if not base_urls:
+            raise ConfigurationError("Missing definition of remote linotp "
+                                     "url in application ini: linotp_url")
+
+        compression_threshold = None
+        if convert(asbool, 'compression', False):
+            compression_threshold = convert(asint, 'compression_threshold',
+                                            DEFAULT_COMPRESSION_THRESHOLD)
+
+        balancer_strategy = get('balancer', LEAST_OUTSTANDING)
+        if balancer_strategy not in (LEAST_OUTSTANDING, EWMA):
+            raise ConfigurationError("unknown balancer strategy %s%s: %r"
+                                     % (prefix, 'balancer', balancer_strategy))
+
+        breaker_args = dict(
+            failure_threshold=convert(asint, 'breaker_failures',
+                                      DEFAULT_FAILURE_THRESHOLD),
+            latency_threshold=convert(float, 'breaker_latency',
+                                      DEFAULT_LATENCY_THRESHOLD),
+            reset_timeout=convert(float, 'breaker_reset_timeout',
+                                  DEFAULT_RESET_TIMEOUT),
+            half_open_calls=convert(asint, 'breaker_half_open_calls',
+                                    DEFAULT_HALF_OPEN_CALLS),
+            )
+
+        try:
+            request_policy = RequestPolicy.from_config(config, prefix=prefix)
+        except (TypeError, ValueError) as exx:
+            raise ConfigurationError("invalid request timeouts: %r" % exx)
+
+        return cls(
+            linotp_url=linotp_url,
+            base_urls=tuple(base_urls),
+            client_key=_file_setting(config, 'client_key', here),
+            client_cert=_file_setting(config, 'client_cert', here),
+            server_cert=_file_setting(config, 'server_cert', here),
+            remote_base=get('remote_base', '/userservice'),
+            pool_size=convert(asint, 'pool_size', DEFAULT_POOL_SIZE),
+            pool_keep_alive=convert(asbool, 'pool_keep_alive', True),
+            pool_idle_timeout=convert(asint, 'pool_idle_timeout',
+                                      DEFAULT_IDLE_TIMEOUT),
+            stream_chunk_size=convert(asint, 'stream_chunk_size',
+                                      DEFAULT_CHUNK_SIZE),
+            compression_threshold=compression_threshold,
+            balancer_strategy=balancer_strategy,
+            health_check_interval=convert(float, 'health_check_interval',
+                                          DEFAULT_HEALTH_CHECK_INTERVAL),
+            health_check_path=get('health_check_path',
+                                  DEFAULT_HEALTH_CHECK_PATH),
+            _breaker_args=tuple(sorted(breaker_args.items())),
+            request_policy=request_policy,
+            )
+
+
+def plugin_settings(settings, app_conf, options, here=None):
+    """
+    get the settings of the repoze.who plugins: the plugins use the
+    Settings of the application, so the plugins and the controllers share
+    one balancer, breaker and pool. The connection settings given in the
+    plugin options of the who.ini have to agree with the application ini.
+
+    :param settings: the Settings of the application
+    :param app_conf: the application ini settings
+    :param options: the plugin options
+    :param here: directory of the application ini
+    :return: the Settings of the application
+    :raises ConfigurationError: if a plugin option disagrees
+    """
+    config = dict(app_conf)
+    for name, value in options.items():
+        if name not in LOCATION_SETTINGS:
+            name = 'linotp_' + name
+        config[name] = value
+
+    differing = settings.differences(Settings.from_config(config, here=here))
+    if differing:
+        raise ConfigurationError("the who.ini plugin options differ from "
+                                 "the application ini: %s"
+                                 % ', '.join(differing))
+    return settings
+
+
+def _file_setting(config, name, here=None):
+    """
+    get the path of a certificate or key file and check, that it exists
+
+    :param config: dict like app_conf or plugin options
+    :param name: name of the setting like 'client_cert'
+    :param here: directory of the ini file, which replaces %(here)s
+    :return: the path or None if not configured
+    :raises ConfigurationError: if the file does not exist
+    """
+    path = config.get(name)
+    if not path:
+        return None
+
+    # replace the app root %here% if any
+    if here and '%(here)s' in path:
+        path = path.replace('%(here)s', here)
+
+    if not os.path.exists(path):
+        raise ConfigurationError("%s %s could not be found" % (name, path))
+
+    return path
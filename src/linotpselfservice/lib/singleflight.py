@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+
+"""
+coalescing of identical concurrent requests to LinOTP
+"""
+
+import logging
+import threading
+
+LOG = logging.getLogger(__name__)
+
+
+class _Flight(object):
+    """
+    one upstream call in progress, which other threads can wait for
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Lets concurrent identical reads share one upstream call: the first
+    thread does the call, the others with the same key wait for and share
+    its result - or its exception.
+
+    The shared result must be treated as read only by all callers.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {}
+
+    def do(self, name, key, func):
+        """
+        call func or wait for the running call with the same key
+
+        :param name: name of the call for the statistics, e.g. the endpoint
+        :param key: hashable key, which identifies identical calls
+        :param func: function without arguments doing the call
+        :return: the result of func
+        """
+        with self._lock:
+            stats = self._stats.setdefault(name, {'calls': 0,
+                                                  'coalesced': 0})
+            flight = self._flights.get(key)
+            if flight is not None:
+                stats['coalesced'] += 1
+                leader = False
+            else:
+                stats['calls'] += 1
+                flight = _Flight()
+                self._flights[key] = flight
+                leader = True
+
+        if not leader:
+            LOG.debug("joining running call to %s", name)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+        except Exception as exx:
+            flight.error = exx
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+        return flight.result
+
+    def stats(self):
+        """
+        :return: dict of name: {'calls': .., 'coalesced': ..} where calls
+                 counts the upstream calls and coalesced the shared ones
+        """
+        with self._lock:
+            return dict((name, dict(stats))
+                        for name, stats in self._stats.items())
+
+
+# process wide coalescing of the upstream reads
+upstream_flights = SingleFlight()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the Mako template lookup of the selfservice
+
+By default, Mako compiles a template on its first use into a module below
+cache_dir/templates. The templates can instead be precompiled, when the
+package is built, by the paster command of linotpselfservice.lib.commands
+
+    paster precompile_templates [<module directory>]
+
+and loaded read only with
+
+    templates.read_only = true
+    templates.module_directory = <module directory>
+
+which defaults to the precompiled templates of the package. All templates
+are then loaded, when the application starts, and nothing is written.
+"""
+
+import os
+import re
+import logging
+
+from mako import codegen
+from mako import compat
+from mako.lookup import TemplateLookup
+from mako.template import ModuleTemplate
+from mako.exceptions import TemplateLookupException
+from pylons.error import handle_mako_error
+
+from linotpselfservice.lib.settings import ConfigurationError
+
+log = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEMPLATE_DIRECTORY = os.path.join(ROOT, 'templates')
+
+# the precompiled template modules shipped with the package
+PRECOMPILED_DIRECTORY = os.path.join(ROOT, 'templates_compiled')
+
+# the options, which the generated template modules depend on - the same
+# for the precompiled and the lazily compiled templates
+TEMPLATE_OPTIONS = dict(
+    error_handler=handle_mako_error,
+    input_encoding='utf-8', default_filters=['escape'],
+    imports=['from webhelpers.html import escape'])
+
+
+def template_uris(directory):
+    """
+    :return: the uris of all templates below the directory
+    """
+    uris = []
+    for path, _dirs, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.mako'):
+                filename = os.path.join(path, name)
+                uris.append('/' + os.path.relpath(filename, directory)
+                                    .replace(os.path.sep, '/'))
+    return sorted(uris)
+
+
+def module_filename(module_directory, uri):
+    """
+    :return: the path of the module of a template - as Mako names it
+    """
+    return os.path.abspath(os.path.join(os.path.normpath(module_directory),
+                                        os.path.normpath(uri.lstrip('/')) +
+                                        '.py'))
+
+
+class PrecompiledTemplateLookup(TemplateLookup):
+    """
+    A TemplateLookup, which only loads precompiled template modules - it
+    neither checks the templates for changes nor writes any module, so the
+    module directory may be read only.
+    """
+
+    def __init__(self, directories, module_directory, **options):
+        super(PrecompiledTemplateLookup, self).__init__(
+                                    directories=directories,
+                                    module_directory=module_directory,
+                                    filesystem_checks=False,
+                                    **options)
+
+    def _load(self, filename, uri):
+        with self._mutex:
+            template = self._collection.get(uri)
+            if template is not None:
+                return template
+
+            path = module_filename(self.module_directory, uri)
+            if not os.path.exists(path):
+                raise TemplateLookupException(
+                            "template %s is not precompiled in %s"
+                            % (uri, self.module_directory))
+
+            module = compat.load_module(re.sub(r'\W', '_', uri), path)
+            if module._magic_number != codegen.MAGIC_NUMBER:
+                raise TemplateLookupException(
+                            "template %s was precompiled by another Mako "
+                            "version" % uri)
+
+            template = ModuleTemplate(
+                            module, module_filename=path,
+                            template_filename=filename, lookup=self,
+                            error_handler=self.template_args['error_handler'])
+            self._collection[uri] = template
+            return template
+
+    def load_all(self):
+        """
+        load all templates - at startup, so that the first requests are
+        not slower and a missing module stops the start
+        """
+        for directory in self.directories:
+            for uri in template_uris(directory):
+                self.get_template(uri)
+
+
+def make_template_lookup(directories, module_directory, read_only=False):
+    """
+    create the TemplateLookup of the application
+
+    :param directories: the template directories
+    :param module_directory: the directory of the compiled templates
+    :param read_only: only load precompiled templates
+    :return: the TemplateLookup
+    :raises ConfigurationError: if a template is not precompiled
+    """
+    if not read_only:
+        return TemplateLookup(directories=directories,
+                              module_directory=module_directory,
+                              **TEMPLATE_OPTIONS)
+
+    lookup = PrecompiledTemplateLookup(directories, module_directory,
+                                       **TEMPLATE_OPTIONS)
+    try:
+        lookup.load_all()
+    except TemplateLookupException as exx:
+        raise ConfigurationError("%s - run 'paster precompile_templates'"
+                                 % exx)
+    return lookup
+
+
+def precompile_templates(module_directory, directories=None):
+    """
+    compile all templates into the module directory
+
+    :param module_directory: the directory of the compiled templates
+    :param directories: the template directories - by default the
+                        templates of the package
+    :return: the uris of the compiled templates
+    """
+    directories = directories or [TEMPLATE_DIRECTORY]
+    lookup = TemplateLookup(directories=directories,
+                            module_directory=module_directory,
+                            **TEMPLATE_OPTIONS)
+    uris = []
+    for directory in directories:
+        for uri in template_uris(directory):
+            lookup.get_template(uri)
+            uris.append(uri)
+    return uris
+
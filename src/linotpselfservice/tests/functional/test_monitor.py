@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the monitor pages of the selfservice
+"""
+
+import json
+import os
+import sys
+
+from beaker.cache import CacheManager
+from beaker.util import parse_cache_config_options
+
+from linotpselfservice.lib.cache import CacheRegion
+from linotpselfservice.lib.cache import regions
+from linotpselfservice.tests import TestController
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+                os.path.dirname(os.path.abspath(__file__))))), 'benchmarks')
+if BENCHMARKS not in sys.path:
+    sys.path.insert(0, BENCHMARKS)
+
+from stub_memcached import StubMemcached
+
+
+class TestMonitorController(TestController):
+
+    def setUp(self):
+        self.memcached = StubMemcached().start()
+        self.created = []
+
+    def tearDown(self):
+        for name in self.created:
+            regions.pop(name, None)
+        self.memcached.stop()
+
+    def region(self, name, **options):
+        """
+        create a region, which is served with all other regions
+        """
+        region = CacheRegion(name, ttl=300, max_size=2)
+        self.created.append(name)
+        settings = {'beaker.cache.regions': name}
+        settings.update(('beaker.cache.%s.%s' % (name, key), value)
+                        for key, value in options.items())
+        manager = CacheManager(**parse_cache_config_options(settings))
+        region.configure(manager, manager.regions.get(name))
+        return region
+
+    def test_cache(self):
+        memory = self.region('test_memory')
+        memcached = self.region('test_memcached', type='ext:memcached',
+                                url=self.memcached.url)
+        for region in (memory, memcached):
+            for user in ('first', 'second', 'third', 'third'):
+                region.get_or_load(user, lambda: {'user': user})
+
+        response = self.app.get('/monitor/cache')
+        self.assertEqual(response.content_type, 'application/json')
+        stats = json.loads(response.body)['cache']
+
+        self.assertEqual(stats['test_memory']['backend'], 'memory')
+        self.assertEqual(stats['test_memory']['hits'], 1)
+        self.assertEqual(stats['test_memory']['misses'], 3)
+        self.assertEqual(stats['test_memory']['evictions'], 1)
+        self.assertEqual(stats['test_memory']['size'], 2)
+
+        self.assertEqual(stats['test_memcached']['backend'], 'ext:memcached')
+        self.assertEqual(stats['test_memcached']['hits'], 1)
+        self.assertEqual(stats['test_memcached']['misses'], 3)
+
+        # the regions of the application are served as well
+        self.assertTrue('context' in stats)
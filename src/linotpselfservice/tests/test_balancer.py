@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the balancer against local stub LinOTP servers
+"""
+
+import os
+import sys
+import threading
+import time
+
+from unittest import TestCase
+
+from linotpselfservice.lib.network import Connection
+from linotpselfservice.lib.network import close_pools
+from linotpselfservice.lib.network import get_balancer
+from linotpselfservice.lib.network import LEAST_OUTSTANDING
+from linotpselfservice.lib.network import EWMA
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(
+                os.path.dirname(os.path.abspath(__file__)))), 'benchmarks')
+if BENCHMARKS not in sys.path:
+    sys.path.insert(0, BENCHMARKS)
+
+from stub_linotp import StubServer
+
+
+def wait_for(condition, timeout=5.0):
+    """
+    :return: True, if the condition is met within the timeout
+    """
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+class BalancerTestCase(TestCase):
+
+    def setUp(self):
+        self.servers = []
+        self.balancers = []
+
+    def tearDown(self):
+        for balancer in self.balancers:
+            balancer.stop()
+        # ends the keep-alive connections served by the stubs
+        close_pools()
+        for server in self.servers:
+            server.stop()
+
+    def start_server(self, port=0, delay=0):
+        server = StubServer(port=port, delay=delay).start()
+        self.servers.append(server)
+        return server
+
+    def connection(self, servers, **args):
+        conn = Connection([server.url for server in servers], **args)
+        self.balancers.append(conn._balancer)
+        return conn
+
+    def post(self, conn, count=1, concurrent=False):
+        """
+        send the requests one after the other or all at once
+        """
+        def send():
+            conn.post('/userservice/context', params={'user': 'u@r'}).close()
+
+        if not concurrent:
+            for _i in range(count):
+                send()
+            return
+        threads = [threading.Thread(target=send) for _i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_least_outstanding(self):
+        """
+        concurrent requests are spread evenly over the servers
+        """
+        slow = [self.start_server(delay=0.3), self.start_server(delay=0.3)]
+        conn = self.connection(slow, strategy=LEAST_OUTSTANDING,
+                               health_check_interval=0)
+
+        self.post(conn, count=4, concurrent=True)
+
+        self.assertEqual([server.requests for server in slow], [2, 2])
+        self.assertEqual([backend.outstanding for backend in
+                          conn._balancer.backends], [0, 0])
+
+    def test_ewma(self):
+        """
+        the requests go to the server with the lower latency
+        """
+        slow = self.start_server(delay=0.2)
+        fast = self.start_server()
+        conn = self.connection([slow, fast], strategy=EWMA,
+                               health_check_interval=0)
+
+        self.post(conn, count=6)
+
+        # the first request measures the slow server, all others go to
+        # the fast one
+        self.assertEqual(slow.requests, 1)
+        self.assertEqual(fast.requests, 5)
+        slow_backend, fast_backend = conn._balancer.backends
+        self.assertTrue(slow_backend.latency > fast_backend.latency)
+
+    def test_health_check(self):
+        """
+        a server is taken out of rotation by the health check, while it is
+        down, and brought back, when it responds again
+        """
+        first = self.start_server()
+        second = self.start_server()
+        port = second.server_address[1]
+        balancer = get_balancer([first.url, second.url],
+                                strategy=LEAST_OUTSTANDING,
+                                health_check_interval=0.05,
+                                health_check_timeout=0.5)
+        self.balancers.append(balancer)
+        first_backend, second_backend = balancer.backends
+
+        # the probes are started with the first request
+        balancer.release(balancer.acquire())
+        second.stop()
+        self.servers.remove(second)
+        self.assertTrue(wait_for(lambda: not second_backend.healthy))
+        self.assertTrue(first_backend.healthy)
+
+        # only the healthy server is chosen, even if it is busy
+        chosen = [balancer.acquire() for _i in range(3)]
+        self.assertEqual(set(chosen), set([first_backend]))
+        for backend in chosen:
+            balancer.release(backend)
+
+        self.start_server(port=port)
+        self.assertTrue(wait_for(lambda: second_backend.healthy))
+
+        chosen = [balancer.acquire() for _i in range(2)]
+        self.assertEqual(chosen, [first_backend, second_backend])
+        for backend in chosen:
+            balancer.release(backend)
+
+    def test_settings_of_second_caller(self):
+        """
+        the same servers with other settings get a balancer of their own
+        """
+        first = self.start_server()
+        second = self.start_server()
+        urls = [first.url, second.url]
+        least = get_balancer(urls, strategy=LEAST_OUTSTANDING,
+                             health_check_interval=0)
+        ewma = get_balancer(urls, strategy=EWMA, health_check_interval=0)
+        self.balancers.extend([least, ewma])
+
+        self.assertTrue(least is not ewma)
+        self.assertEqual(ewma.strategy, EWMA)
+        self.assertTrue(least is get_balancer(urls, strategy=LEAST_OUTSTANDING,
+                                              health_check_interval=0))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the state machine of the circuit breaker
+"""
+
+from unittest import TestCase
+
+from linotpselfservice.lib import breaker as breaker_module
+from linotpselfservice.lib.breaker import CircuitBreaker
+from linotpselfservice.lib.breaker import CircuitOpenError
+from linotpselfservice.lib.breaker import CLOSED
+from linotpselfservice.lib.breaker import OPEN
+from linotpselfservice.lib.breaker import HALF_OPEN
+
+
+class Clock(object):
+    """
+    the time module of the breaker - moved on by the tests
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class CircuitBreakerTestCase(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.time = breaker_module.time
+        breaker_module.time = self.clock
+        self.breaker = CircuitBreaker(name='test', failure_threshold=3,
+                                      latency_threshold=2.0,
+                                      reset_timeout=30.0, half_open_calls=1)
+
+    def tearDown(self):
+        breaker_module.time = self.time
+
+    def trip(self):
+        for _i in range(3):
+            self.breaker.allow()
+            self.breaker.record_failure()
+
+    def test_opens_after_failure_threshold(self):
+        for _i in range(2):
+            self.breaker.allow()
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.status()['trips'], 1)
+
+    def test_success_resets_failures(self):
+        for _i in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success(latency=0.1)
+        for _i in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_rejects_while_open(self):
+        self.trip()
+        self.clock.now += 29.0
+        for _i in range(3):
+            self.assertRaises(CircuitOpenError, self.breaker.allow)
+        self.assertEqual(self.breaker.status()['rejected'], 3)
+
+    def test_single_half_open_probe(self):
+        self.trip()
+        self.clock.now += 30.0
+
+        # the first request after the reset timeout is the probe
+        self.breaker.allow()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertRaises(CircuitOpenError, self.breaker.allow)
+
+        self.breaker.record_success(latency=0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.allow()
+
+    def test_reopens_when_probe_fails(self):
+        self.trip()
+        self.clock.now += 30.0
+        self.breaker.allow()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.status()['trips'], 2)
+        self.assertRaises(CircuitOpenError, self.breaker.allow)
+
+        # the reset timeout starts again
+        self.clock.now += 29.0
+        self.assertRaises(CircuitOpenError, self.breaker.allow)
+        self.clock.now += 1.0
+        self.breaker.allow()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_slow_request_is_failure(self):
+        for _i in range(3):
+            self.breaker.allow()
+            self.breaker.record_success(latency=2.5)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_slow_probe_reopens(self):
+        self.trip()
+        self.clock.now += 30.0
+        self.breaker.allow()
+        self.breaker.record_success(latency=2.5)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_disabled(self):
+        breaker = CircuitBreaker(failure_threshold=0)
+        for _i in range(10):
+            breaker.allow()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
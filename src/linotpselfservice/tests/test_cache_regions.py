@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the cache regions on the in-process, sqlite and beaker backends - the
+ext:memcached region runs against the memcached stand-in of the benchmarks
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from unittest import TestCase
+
+from beaker.cache import CacheManager
+from beaker.util import parse_cache_config_options
+
+from linotpselfservice.lib.cache import CacheRegion
+from linotpselfservice.lib.cache import regions
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(
+                os.path.dirname(os.path.abspath(__file__)))), 'benchmarks')
+if BENCHMARKS not in sys.path:
+    sys.path.insert(0, BENCHMARKS)
+
+from stub_memcached import StubMemcached
+
+
+def configure(region, settings):
+    """
+    set up the region from the beaker settings of the application ini
+    """
+    manager = CacheManager(**parse_cache_config_options(settings))
+    region.configure(manager, manager.regions.get(region.name))
+    return region
+
+
+class CacheRegionTestCase(TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.memcached = StubMemcached().start()
+        self.region = CacheRegion('test_region', ttl=300, max_size=2)
+
+    def tearDown(self):
+        regions.pop(self.region.name, None)
+        self.memcached.stop()
+        shutil.rmtree(self.data_dir)
+
+    def backends(self):
+        """
+        :return: list of (type, beaker settings) of all backends
+        """
+        name = 'beaker.cache.%s.' % self.region.name
+        settings = {'beaker.cache.regions': self.region.name,
+                    'beaker.cache.data_dir': self.data_dir + '/data',
+                    'beaker.cache.lock_dir': self.data_dir + '/lock'}
+        backends = [
+            ('memory', {}),
+            ('sqlite', {'type': 'sqlite',
+                        'path': self.data_dir + '/regions.sqlite'}),
+            ('file', {'type': 'file'}),
+            ('dbm', {'type': 'dbm'}),
+            ('ext:memcached', {'type': 'ext:memcached',
+                               'url': self.memcached.url}),
+            ]
+        return [(cache_type, dict(settings, **dict(
+                        (name + key, value) for key, value in options.items())))
+                for cache_type, options in backends]
+
+    def test_backend_type(self):
+        for cache_type, settings in self.backends():
+            region = configure(self.region, settings)
+            self.assertEqual(region.stats()['backend'], cache_type)
+
+    def test_ttl_expiry(self):
+        for cache_type, settings in self.backends():
+            region = configure(self.region, settings)
+            loads = []
+
+            def load():
+                loads.append(1)
+                return {'user': 'u@r', 'load': len(loads)}
+
+            self.assertEqual(region.get_or_load('u@r', load, ttl=0.2)['load'],
+                             1, cache_type)
+            self.assertEqual(region.get_or_load('u@r', load, ttl=0.2)['load'],
+                             1, cache_type)
+            time.sleep(0.3)
+            self.assertEqual(region.get('u@r'), None, cache_type)
+            self.assertEqual(region.get_or_load('u@r', load, ttl=0.2)['load'],
+                             2, cache_type)
+
+            stats = region.stats()
+            self.assertEqual((stats['hits'], stats['misses']), (1, 3),
+                             cache_type)
+
+    def test_max_size_eviction(self):
+        """
+        the in-process and the sqlite regions evict the oldest entries
+        above max_size - the beaker backends evict by themselves
+        """
+        for cache_type, settings in self.backends()[:2]:
+            region = configure(self.region, settings)
+            for user in ('first', 'second', 'third'):
+                region.set(user, {'user': user})
+                # the sqlite region evicts by the time of storing
+                time.sleep(0.01)
+            if cache_type == 'sqlite':
+                region.backend.prune()
+
+            self.assertEqual(region.get('first'), None, cache_type)
+            self.assertEqual(region.get('third'), {'user': 'third'},
+                             cache_type)
+            stats = region.stats()
+            self.assertEqual(stats['evictions'], 1, cache_type)
+            self.assertEqual(stats['size'], 2, cache_type)
+
+    def test_invalidate(self):
+        for cache_type, settings in self.backends():
+            region = configure(self.region, settings)
+            region.set(('user', 'session'), 'context')
+            self.assertEqual(region.get(('user', 'session')), 'context',
+                             cache_type)
+            region.invalidate(('user', 'session'))
+            self.assertEqual(region.get(('user', 'session')), None,
+                             cache_type)
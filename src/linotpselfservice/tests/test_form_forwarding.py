@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the forwarding of the raw request form to LinOTP - the client must not
+override the user and the session, which are set by the selfservice
+"""
+
+import urlparse
+
+from unittest import TestCase
+
+import pylons
+
+from webob import Request
+
+from linotpselfservice.lib.base import BaseController
+from linotpselfservice.lib.network import merge_form
+
+
+class MergeFormTestCase(TestCase):
+
+    def fields(self, form):
+        return urlparse.parse_qsl(form, keep_blank_values=True)
+
+    def test_override(self):
+        form = merge_form('serial=S1&user=evil', {'user': 'alice'})
+        self.assertEqual(self.fields(form), [('serial', 'S1'),
+                                             ('user', 'alice')])
+
+    def test_encoded_name(self):
+        form = merge_form('us%65r=evil&%73ession=forged&serial=S1',
+                          {'user': 'alice'}, exclude=['session'])
+        self.assertEqual(self.fields(form), [('serial', 'S1'),
+                                             ('user', 'alice')])
+
+    def test_plus_encoded_name(self):
+        # a plus is a space, so it does not hide the user field
+        form = merge_form('us+er=evil', {'user': 'alice'})
+        self.assertEqual(self.fields(form), [('us er', 'evil'),
+                                             ('user', 'alice')])
+
+    def test_semicolon_separated(self):
+        form = merge_form('serial=S1;user=evil;session=forged',
+                          {'user': 'alice'}, exclude=['session'])
+        self.assertEqual(self.fields(form), [('serial', 'S1'),
+                                             ('user', 'alice')])
+
+    def test_duplicate_fields(self):
+        form = merge_form('user=evil&user=other&session=a&session=b',
+                          {'user': 'alice', 'session': 'sess'})
+        self.assertEqual(sorted(self.fields(form)), [('session', 'sess'),
+                                                     ('user', 'alice')])
+
+    def test_values_are_not_decoded(self):
+        form = merge_form('x=%C3%A4&y=a+b&z=%26', {'user': 'alice'})
+        self.assertEqual(form, 'x=%C3%A4&y=a+b&z=%26&user=alice')
+
+    def test_empty_form(self):
+        self.assertEqual(merge_form('', {'user': 'alice'}), 'user=alice')
+        self.assertEqual(merge_form(None), '')
+        self.assertEqual(merge_form('&&user=evil&', exclude=['user']), '')
+
+
+class Reply(object):
+    """
+    the network Response of a successful request
+    """
+    status_code = 200
+    reason = 'OK'
+    deadline_used = None
+
+    def json(self):
+        return {'result': {'status': True}}
+
+
+class RecordingConnection(object):
+    """
+    records the requests instead of sending them to LinOTP
+    """
+    def __init__(self):
+        self.requests = []
+
+    def post(self, path, **kwargs):
+        self.requests.append((path, kwargs))
+        return Reply()
+
+
+class RequestFormTestCase(TestCase):
+
+    def setUp(self):
+        self.controller = BaseController.__new__(BaseController)
+        self.controller.conn = RecordingConnection()
+        self.controller.language = 'en'
+        self.controller.auth_cookie = 'sess'
+
+    def tearDown(self):
+        pylons.request._pop_object()
+
+    def request(self, path, method='GET', body=None, content_type=None):
+        environ = {'REQUEST_METHOD': method}
+        if content_type:
+            environ['CONTENT_TYPE'] = content_type
+        req = Request.blank(path, environ=environ)
+        if body is not None:
+            req.body = body
+        pylons.request._push_object(req)
+        return req
+
+    def forward(self, params):
+        self.controller.call_linotp('/userservice/enable', params=params,
+                                    forward_request=True)
+        return self.controller.conn.requests[-1][1]
+
+    def test_query_string(self):
+        self.request('/userservice/enable?serial=S1&us%65r=evil')
+        self.assertEqual(self.controller.get_request_form(),
+                         'serial=S1&us%65r=evil')
+
+    def test_query_and_body(self):
+        self.request('/userservice/enable?a=1', method='POST',
+                     body='serial=S1;session=forged',
+                     content_type='application/x-www-form-urlencoded; '
+                                  'charset=UTF-8')
+        self.assertEqual(self.controller.get_request_form(),
+                         'a=1&serial=S1;session=forged')
+
+    def test_forwarded_form(self):
+        """
+        the session of the client is removed, the user is passed by
+        the connection along with the upstream session
+        """
+        self.request('/userservice/enable', method='POST',
+                     body='serial=S1&%73ession=forged&x=%C3%A4',
+                     content_type='application/x-www-form-urlencoded')
+        sent = self.forward({'user': 'alice'})
+        self.assertEqual(sent['form'], 'serial=S1&x=%C3%A4')
+        self.assertEqual(sent['params'], {'user': 'alice'})
+        self.assertEqual(sent['session'], 'sess')
+
+    def test_fallback(self):
+        """
+        a request, which is not urlencoded, is forwarded by its decoded
+        parameters - the given parameters replace those of the client
+        """
+        self.request('/userservice/enable?user=evil&serial=S1&session=x',
+                     method='POST', body='{"session": "forged"}',
+                     content_type='application/json')
+        self.assertEqual(self.controller.get_request_form(), None)
+
+        sent = self.forward({'user': 'alice'})
+        self.assertEqual(sent['form'], None)
+        self.assertEqual(sent['params'], {'user': 'alice', 'serial': 'S1'})
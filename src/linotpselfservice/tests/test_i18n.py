@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the parsing and negotiation of the Accept-Language header
+"""
+
+from unittest import TestCase
+
+from linotpselfservice.lib.i18n import negotiate_language
+from linotpselfservice.lib.i18n import parse_accept_language
+from linotpselfservice.lib.i18n import MAX_ACCEPT_LANGUAGE
+
+
+class ParseAcceptLanguageTestCase(TestCase):
+
+    def test_order_by_quality(self):
+        self.assertEqual(
+            parse_accept_language('en;q=0.3, de-DE, fr;q=0.7, it;q=1'),
+            ['de', 'it', 'fr', 'en'])
+
+    def test_ties_keep_header_order(self):
+        self.assertEqual(
+            parse_accept_language('fr;q=0.5, de, es;q=0.5, en'),
+            ['de', 'en', 'fr', 'es'])
+
+    def test_not_acceptable(self):
+        self.assertEqual(
+            parse_accept_language('de;q=0, fr;q=0.0, en;q=0.1'), ['en'])
+
+    def test_nan_and_inf(self):
+        self.assertEqual(
+            parse_accept_language('de;q=nan, fr;q=inf, es;q=-inf, '
+                                  'it;q=1.5, en'), ['en'])
+
+    def test_wildcard(self):
+        self.assertEqual(parse_accept_language('*, de;q=0.5'), ['de'])
+        self.assertEqual(parse_accept_language('*'), [])
+
+    def test_malformed(self):
+        self.assertEqual(
+            parse_accept_language(';q=0.5, de;q=x, 1234, toolonglang, '
+                                  'fr_CA;Q=0.9, ,, en ; q = 0.8 '),
+            ['fr', 'en'])
+        self.assertEqual(parse_accept_language(''), [])
+        self.assertEqual(parse_accept_language(' \t;;;,,,'), [])
+
+    def test_parameters(self):
+        # only the q parameter is evaluated
+        self.assertEqual(
+            parse_accept_language('de;level=1;q=0.2, en;x=y'), ['en', 'de'])
+
+    def test_cap(self):
+        """
+        the header is evaluated up to the last complete range within
+        MAX_ACCEPT_LANGUAGE characters
+        """
+        filler = ','.join(['xx;q=0.1'] * (MAX_ACCEPT_LANGUAGE // 9))
+        header = filler + ',de;q=0.5'
+        self.assertTrue(len(header) > MAX_ACCEPT_LANGUAGE)
+        self.assertEqual(parse_accept_language(header),
+                         ['xx'] * (MAX_ACCEPT_LANGUAGE // 9))
+
+        # a range cut by the cap is dropped, not shortened
+        header = 'de;q=0.5,' + 'a' * (MAX_ACCEPT_LANGUAGE - 12) + ',english'
+        self.assertEqual(parse_accept_language(header), ['de'])
+
+        # the time stays linear for a hostile header
+        self.assertEqual(parse_accept_language(';' * 1000000), [])
+
+
+class NegotiateLanguageTestCase(TestCase):
+
+    def test_negotiate(self):
+        languages = {'de': None, 'fr': None}
+        self.assertEqual(negotiate_language('it, fr;q=0.5, de;q=0.4',
+                                            languages), 'fr')
+        self.assertEqual(negotiate_language('en-US, de;q=0.5', languages),
+                         'en')
+        self.assertEqual(negotiate_language('it, es', languages), None)
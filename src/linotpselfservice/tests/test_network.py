@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2015 LSE Leading Security Experts GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@lsexperts.de
+#    Contact: www.linotp.org
+#    Support: www.lsexperts.de
+#
+"""
+the network layer of the connection to LinOTP
+"""
+
+import BaseHTTPServer
+import os
+import threading
+
+from unittest import TestCase
+
+import requests
+
+from linotpselfservice.lib.network import ConnectionPool
+
+
+class RedirectingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    redirects /old to /new and sets a cookie - /new echoes the request
+    headers
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/old':
+            self.send_response(302)
+            self.send_header('Location', '/new')
+            self.send_header('Set-Cookie', 'userauthcookie=other; Path=/')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = '\n'.join('%s: %s' % (name, value) for name, value
+                         in sorted(self.headers.items()))
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ConnectionPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                RedirectingHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.pool = ConnectionPool(self.url)
+        self.environ = dict(os.environ)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_redirect(self):
+        response = self.pool.send('GET', self.url + '/old', timeout=(3, 3))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.url, self.url + '/new')
+
+    def test_default_headers(self):
+        response = self.pool.send('GET', self.url + '/new', timeout=(3, 3))
+        self.assertTrue('accept-encoding: gzip, deflate' in
+                        response.text.lower())
+
+    def test_no_cookies_kept(self):
+        """
+        the pool is shared by all users, so it must not keep any cookie
+        """
+        self.pool.send('GET', self.url + '/old', timeout=(3, 3))
+        response = self.pool.send('GET', self.url + '/new',
+                                  cookies={'userauthcookie': 'mine'},
+                                  timeout=(3, 3))
+        self.assertTrue('userauthcookie=mine' in response.text)
+        self.assertEqual(len(self.pool._session.cookies), 0)
+
+    def test_proxy_from_environment(self):
+        os.environ.pop('NO_PROXY', None)
+        os.environ.pop('no_proxy', None)
+        os.environ['HTTP_PROXY'] = 'http://127.0.0.1:1'
+        self.assertRaises(requests.exceptions.ProxyError, self.pool.send,
+                          'GET', 'http://linotp.invalid/', timeout=(3, 3))
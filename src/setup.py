@@ -20,6 +20,10 @@ setup(
         "repoze.who<2.0",
         "requests",
     ],
+    extras_require={
+        # the ext:memcached backend of the beaker cache regions
+        'memcached': ["python-memcached"],
+    },
     setup_requires=["PasteScript>=1.6.3"],
     packages=find_packages(exclude=['ez_setup']),
     include_package_data=True,
@@ -39,5 +43,8 @@ setup(
 
     [paste.app_install]
     main = pylons.util:PylonsInstaller
+
+    [paste.paster_command]
+    precompile_templates = linotpselfservice.lib.commands:PrecompileTemplatesCommand
     """,
 )